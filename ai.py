@@ -0,0 +1,232 @@
+"""Computer player based on Monte Carlo tree search.
+
+Both players move at the same time in 7-stones, so the tree is searched with
+decoupled UCT: every node keeps separate statistics for each player's move
+sets, each player picks a move set by UCB on its own statistics, and the
+pair is applied together before ``grid.resolve_units``, just like a turn of
+the hot-seat loop. A move set is a tuple with the target cell index of each
+of the player's units, in ``grid.get_player_units`` order.
+
+The computer only sees what a human in its seat would: the search starts
+from a copy of the board with every opponent unit and city outside the
+player's sight (``grid.compute_visibility_map``) taken off.
+
+Searches can be spread over a process pool. Each worker runs its own tree
+from the same root move sets and the visit counts are summed (root
+parallelisation). Workers are sent the position as a ``state.serialize``
+checkpoint rather than a pickled board.
+"""
+from functools import partial
+import math
+import multiprocessing
+import random
+import time
+from typing import Dict, List, Tuple
+
+import grid
+import state
+
+JointMove = Tuple[int, ...]
+
+
+def determinize(board: grid.Board, player: int) -> grid.Board:
+    """Return a snapshot of the board holding only what the player can see."""
+    view = board.snapshot()
+    opponent = grid.get_opposing_player(player)
+    visible = grid.compute_visibility_map(view, player).ravel()
+    for unit in grid.get_player_units(view, opponent):
+        if not visible[view.unit_cells[unit]]:
+            grid.remove_unit(view, unit)
+    for index in view.city_indices(opponent):
+        if not visible[index]:
+            view.cell(*divmod(index, view.width)).city = None
+    return view
+
+
+def random_move(board: grid.Board, player: int, rng: random.Random) -> JointMove:
+    return tuple(rng.choice(board.reachable(unit.movement)[board.unit_cells[unit]])
+                 for unit in grid.get_player_units(board, player))
+
+
+def candidate_moves(board: grid.Board, player: int, rng: random.Random, count: int) -> List[JointMove]:
+    """Sample up to ``count`` distinct move sets, always including standing still."""
+    units = grid.get_player_units(board, player)
+    moves = [tuple(board.unit_cells[unit] for unit in units)]
+    seen = set(moves)
+    for _ in range(count * 4):
+        if len(moves) >= count:
+            break
+        move = random_move(board, player, rng)
+        if move not in seen:
+            seen.add(move)
+            moves.append(move)
+    return moves
+
+
+def apply_moves(board: grid.Board, player_1_move: JointMove, player_2_move: JointMove) -> int | None:
+    """Play one simultaneous turn and return the winner, if any."""
+    player_moves = []
+    for player, move in ((1, player_1_move), (2, player_2_move)):
+        units = grid.get_player_units(board, player)
+        player_moves.append(grid.expand_joint_move(board, units, move))
+    grid.apply_turn(board, *player_moves)
+    grid.resolve_units(board)
+    return grid.check_for_winner(board)
+
+
+def score(board: grid.Board, winner: int | None) -> float:
+    """Result of a position for player 1, between 0 and 1."""
+    if winner == 1:
+        return 1.0
+    if winner == 2:
+        return 0.0
+    if winner == 3:
+        return 0.5
+    difference = board.unit_count(1) - board.unit_count(2)
+    return 0.5 + difference / (4 * grid.MAX_PLAYER_UNITS)
+
+
+class Node():
+    __slots__ = ("moves", "stats", "children", "visits")
+
+    def __init__(self, moves: Dict[int, List[JointMove]]):
+        self.moves = moves
+        self.stats = {player: [[0, 0.0] for _ in moves[player]] for player in (1, 2)}
+        self.children: Dict[Tuple[int, int], "Node"] = {}
+        self.visits = 0
+
+    def select(self, player: int, exploration: float) -> int:
+        best, best_value = 0, -1.0
+        log_visits = math.log(self.visits + 1)
+        for choice, (visits, total) in enumerate(self.stats[player]):
+            if visits == 0:
+                return choice
+            value = total / visits + exploration * math.sqrt(log_visits / visits)
+            if value > best_value:
+                best, best_value = choice, value
+        return best
+
+
+class SearchSettings():
+    def __init__(self, iterations: int | None = None, time_limit: float | None = 1.0, branching: int = 12,
+                 rollout_depth: int = 8, exploration: float = 1.4):
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.branching = branching
+        self.rollout_depth = rollout_depth
+        self.exploration = exploration
+
+
+def search(board: grid.Board, root_moves: Dict[int, List[JointMove]], settings: SearchSettings,
+           seed: int) -> Tuple[Dict[int, List[int]], int]:
+    """Run one search tree and return the root visit counts per player and
+    the number of nodes visited."""
+    rng = random.Random(seed)
+    root = Node(root_moves)
+    deadline = None if settings.time_limit is None else time.perf_counter() + settings.time_limit
+    iterations = 0
+    nodes = 0
+    while True:
+        if settings.iterations is not None and iterations >= settings.iterations:
+            break
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        iterations += 1
+        trial = board.snapshot()
+        node = root
+        path = []
+        winner = None
+        while True:
+            choices = (node.select(1, settings.exploration), node.select(2, settings.exploration))
+            path.append((node, choices))
+            winner = apply_moves(trial, node.moves[1][choices[0]], node.moves[2][choices[1]])
+            nodes += 1
+            if winner is not None:
+                break
+            child = node.children.get(choices)
+            if child is None:
+                node.children[choices] = Node({player: candidate_moves(trial, player, rng, settings.branching)
+                                               for player in (1, 2)})
+                winner = _rollout(trial, rng, settings.rollout_depth)
+                break
+            node = child
+        result = score(trial, winner)
+        for visited, (choice_1, choice_2) in path:
+            visited.visits += 1
+            visited.stats[1][choice_1][0] += 1
+            visited.stats[1][choice_1][1] += result
+            visited.stats[2][choice_2][0] += 1
+            visited.stats[2][choice_2][1] += 1.0 - result
+    visits = {player: [visits for visits, _ in root.stats[player]] for player in (1, 2)}
+    return visits, nodes
+
+
+def _search_state(data: bytes, root_moves: Dict[int, List[JointMove]], settings: SearchSettings,
+                  seed: int) -> Tuple[Dict[int, List[int]], int]:
+    return search(state.deserialize(data), root_moves, settings, seed)
+
+
+def _rollout(board: grid.Board, rng: random.Random, depth: int) -> int | None:
+    for _ in range(depth):
+        winner = apply_moves(board, random_move(board, 1, rng), random_move(board, 2, rng))
+        if winner is not None:
+            return winner
+    return None
+
+
+class SearchReport():
+    def __init__(self, nodes: int, seconds: float, visits: List[int]):
+        self.nodes = nodes
+        self.seconds = seconds
+        self.visits = visits
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds else float("inf")
+
+    def __repr__(self):
+        return f"SearchReport(nodes={self.nodes}, seconds={self.seconds:.2f}, nodes_per_second={self.nodes_per_second:.0f})"
+
+
+class MCTSPlayer():
+    """Chooses a player's whole move set for a turn.
+
+    ``iterations`` and ``time_limit`` bound each worker's search; either may
+    be None. With ``processes`` above 1 the searches run on a process pool.
+    """
+    def __init__(self, iterations: int | None = None, time_limit: float | None = 1.0, processes: int = 1,
+                 branching: int = 12, rollout_depth: int = 8, seed: int | None = None):
+        self.settings = SearchSettings(iterations, time_limit, branching, rollout_depth)
+        self.processes = processes
+        self.rng = random.Random(seed)
+        self.last_report = None
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def choose_moves(self, board: grid.Board, player: int) -> List[Tuple[grid.Unit, grid.Cell]]:
+        visible = determinize(board, player)
+        root_moves = {side: candidate_moves(visible, side, self.rng, self.settings.branching) for side in (1, 2)}
+        seeds = [self.rng.randrange(2 ** 32) for _ in range(self.processes)]
+        start = time.perf_counter()
+        if self.processes == 1:
+            results = [search(visible, root_moves, self.settings, seeds[0])]
+        else:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.processes)
+            results = self._pool.map(partial(_search_state, state.serialize(visible), root_moves, self.settings), seeds)
+        seconds = time.perf_counter() - start
+        visits = [sum(counts) for counts in zip(*(result[0][player] for result in results))]
+        self.last_report = SearchReport(sum(result[1] for result in results), seconds, visits)
+        best = max(range(len(visits)), key=visits.__getitem__)
+        units = grid.get_player_units(board, player)
+        return grid.expand_joint_move(board, units, root_moves[player][best])
+
+
+def mcts_policy(board: grid.Board, player: int, rng: random.Random) -> List[Tuple[grid.Unit, grid.Cell]]:
+    """``simulate``-compatible policy running a small single-process search."""
+    return MCTSPlayer(iterations=200, time_limit=None, seed=rng.randrange(2 ** 32)).choose_moves(board, player)
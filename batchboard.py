@@ -0,0 +1,259 @@
+"""Many 7-stones games stepped at once as NumPy arrays.
+
+A ``BatchBoard`` holds N games of the same size. ``terrain`` and ``cities``
+are ``(N, height, width)`` arrays of ``grid.Terrain`` values and city owners
+(0 for none), and ``units`` is an ``(N, 2, height, width)`` array with the
+number of units each player has on every cell, like ``Board.unit_control``.
+The kernels below work on whole batches with the same semantics as the
+functions in ``grid``:
+
+- ``control`` matches ``get_cell_control`` / ``compute_control_map``,
+- ``free`` matches ``check_for_freedom`` for every cell and both players,
+- ``resolve`` matches ``resolve_units`` and ``winner`` ``check_for_winner``,
+  except that "no winner" is 0 instead of None.
+
+Like ``bitboard``, this is only for units with a control of 1, which is what
+``grid.Unit`` uses. Moves are rows of ``(game, player, source, target)``
+with cells given as flat indices ``row * width + column``. The terrain is
+not meant to change once a batch is built.
+
+Play random self-play games with ``python batchboard.py --games 10000``.
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+import grid
+
+
+def control(units: np.ndarray, cities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the signed control and the "no influence" mask of every game,
+    both ``(N, height, width)``, as ``grid.compute_control_map`` does."""
+    influence = grid.spread_control(units)
+    no_influence = (influence[:, 0] == 0) & (influence[:, 1] == 0) & (cities == 0)
+    return influence[:, 0] - influence[:, 1], no_influence
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    grown = mask.copy()
+    grown[..., 1:, :] |= mask[..., :-1, :]
+    grown[..., :-1, :] |= mask[..., 1:, :]
+    grown[..., :, 1:] |= mask[..., :, :-1]
+    grown[..., :, :-1] |= mask[..., :, 1:]
+    return grown
+
+
+def free(units: np.ndarray, cities: np.ndarray) -> np.ndarray:
+    """Return the ``(N, 2, height, width)`` mask of the cells where each
+    player's units have freedom: the player's controlled-or-contested cells
+    connected to a cell nobody has influence over."""
+    signed, no_influence = control(units, cities)
+    member = np.stack([signed >= 0, signed <= 0], axis=1) & ~no_influence[:, None]
+    region = member & _dilate(np.broadcast_to(no_influence[:, None], member.shape))
+    # Most games stop growing after a step or two, so only the games whose
+    # regions still grow are dilated again.
+    games = np.arange(len(units))
+    while len(games):
+        current = region[games]
+        grown = _dilate(current) & member[games]
+        changed = (grown != current).any(axis=(1, 2, 3))
+        games = games[changed]
+        region[games] = grown[changed]
+    return region
+
+
+def winner(units: np.ndarray, cities: np.ndarray) -> np.ndarray:
+    """Return the winner of every game: 1, 2, 3 for a draw or 0 for none."""
+    return _winner(free(units, cities), cities)
+
+
+def _winner(has_freedom: np.ndarray, cities: np.ndarray) -> np.ndarray:
+    captured = [((cities == player) & ~has_freedom[:, player - 1]).sum(axis=(1, 2)) for player in (1, 2)]
+    total = captured[0] + captured[1]
+    return np.where(total == 1, np.where(captured[0] == 1, 2, 1), np.where(total == 2, 3, 0)).astype(np.int8)
+
+
+def resolve(units: np.ndarray, cities: np.ndarray) -> np.ndarray:
+    """Remove units without freedom in place until every game is stable.
+
+    Returns the number of rounds each game took, counting the last one that
+    removed nothing, like ``ResolutionStats.rounds``.
+    """
+    return _resolve(units, cities)[0]
+
+
+def _resolve(units: np.ndarray, cities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """``resolve``, also returning the freedom mask of the resolved games."""
+    rounds = np.zeros(len(units), dtype=np.int32)
+    has_freedom = np.zeros(units.shape, dtype=bool)
+    games = np.arange(len(units))
+    while len(games):
+        rounds[games] += 1
+        playing = units[games]
+        playing_freedom = free(playing, cities[games])
+        has_freedom[games] = playing_freedom
+        dead = (playing > 0) & ~playing_freedom
+        playing[dead] = 0
+        units[games] = playing
+        games = games[dead.any(axis=(1, 2, 3))]
+    return rounds, has_freedom
+
+
+class BatchBoard():
+    def __init__(self, terrain: np.ndarray, cities: np.ndarray, units: np.ndarray):
+        self.terrain = terrain
+        self.cities = cities
+        self.units = units
+        self.games, self.height, self.width = terrain.shape
+        self.turns = np.zeros(self.games, dtype=np.int32)
+        self.winners = np.zeros(self.games, dtype=np.int8)
+        self.blocked = (terrain == grid.Terrain.LAKE) | (terrain == grid.Terrain.MOUNTAIN)
+
+    def control(self) -> Tuple[np.ndarray, np.ndarray]:
+        return control(self.units, self.cities)
+
+    def free(self) -> np.ndarray:
+        return free(self.units, self.cities)
+
+    def resolve(self) -> np.ndarray:
+        return resolve(self.units, self.cities)
+
+    def winner(self) -> np.ndarray:
+        return winner(self.units, self.cities)
+
+    def move_errors(self, moves: np.ndarray) -> List[Tuple[int, int, str]]:
+        """Return ``(player, move number, reason)`` for every illegal move."""
+        game, player, source, target = moves.T
+        size = self.height * self.width
+        in_range = (game >= 0) & (game < self.games) & ((player == 1) | (player == 2)) \
+            & (source >= 0) & (source < size) & (target >= 0) & (target < size)
+        checked = np.flatnonzero(in_range)
+        game, player, source, target = game[checked], player[checked], source[checked], target[checked]
+        # Later checks take precedence, in the order of ``grid.apply_turn``.
+        reasons = np.zeros(len(moves), dtype=np.int8)
+        distance = np.abs(source // self.width - target // self.width) + np.abs(source % self.width - target % self.width)
+        reasons[checked[distance > 1]] = 4
+        reasons[checked[self.blocked.reshape(self.games, -1)[game, target]]] = 3
+        # The n-th move out of a cell needs n units of the player on it.
+        key = (game * 2 + player - 1) * size + source
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        available = self.units.reshape(self.games, 2, -1)[game, player - 1, source]
+        reasons[checked[order[rank >= available[order]]]] = 5
+        reasons[checked[self.winners[game] != 0]] = 2
+        reasons[~in_range] = 1
+        messages = {
+            1: "Move is not on the board",
+            2: "Game is already over",
+            3: "Invalid coordinates, unit cannot be placed on lake.",
+            4: "Unit cannot move that far",
+            5: "No unit left to move",
+        }
+        return [(int(moves[number, 1]), int(number), messages[reasons[number]]) for number in np.flatnonzero(reasons)]
+
+    def step(self, moves: np.ndarray) -> np.ndarray:
+        """Play one turn of every game still in play and return the winners.
+
+        ``moves`` holds both players' moves for all games. The whole batch is
+        checked against the pre-turn state first, and ``grid.InvalidTurnError``
+        is raised without changing anything if any move is illegal.
+        """
+        moves = np.asarray(moves, dtype=np.int64).reshape(-1, 4)
+        errors = self.move_errors(moves)
+        if errors:
+            raise grid.InvalidTurnError(errors)
+        game, player, source, target = moves.T
+        flat = self.units.reshape(self.games, 2, -1)
+        np.subtract.at(flat, (game, player - 1, source), 1)
+        np.add.at(flat, (game, player - 1, target), 1)
+        playing = np.flatnonzero(self.winners == 0)
+        units = self.units[playing]
+        cities = self.cities[playing]
+        has_freedom = _resolve(units, cities)[1]
+        self.units[playing] = units
+        self.winners[playing] = _winner(has_freedom, cities)
+        self.turns[playing] += 1
+        return self.winners
+
+    def random_moves(self, rng: np.random.Generator) -> np.ndarray:
+        """Move every unit of the games in play to a random reachable cell,
+        possibly its own, like ``simulate.random_policy``. Units that stay put
+        get no move."""
+        playing = self.winners == 0
+        counts = self.units.reshape(self.games, 2, -1) * playing[:, None, None]
+        game, player, source = np.nonzero(counts)
+        repeats = counts[game, player, source]
+        game, player, source = np.repeat(game, repeats), np.repeat(player, repeats) + 1, np.repeat(source, repeats)
+        row, column = source // self.width, source % self.width
+        candidates = np.stack([
+            source,
+            np.where(row > 0, source - self.width, -1),
+            np.where(row < self.height - 1, source + self.width, -1),
+            np.where(column > 0, source - 1, -1),
+            np.where(column < self.width - 1, source + 1, -1),
+        ], axis=1)
+        open_cells = ~self.blocked.reshape(self.games, -1)
+        valid = (candidates >= 0) & open_cells[game[:, None], np.maximum(candidates, 0)]
+        choice = np.argmax(rng.random(candidates.shape) * valid, axis=1)
+        target = candidates[np.arange(len(candidates)), choice]
+        moved = target != source
+        return np.stack([game, player, source, target], axis=1)[moved]
+
+    def play(self, max_turns: int, rng: np.random.Generator) -> np.ndarray:
+        """Play random moves until every game has a winner or ``max_turns``
+        turns; return the winners, with 0 for unfinished games."""
+        while (self.winners == 0).any() and self.turns.max() < max_turns:
+            self.step(self.random_moves(rng))
+        return self.winners
+
+
+def from_boards(boards: List[grid.Board]) -> BatchBoard:
+    """Stack boards of the same size into a batch."""
+    for board in boards:
+        for unit in board.unit_cells:
+            if unit.control != 1:
+                raise ValueError("BatchBoard only supports units with a control of 1")
+    if len({(board.height, board.width) for board in boards}) > 1:
+        raise ValueError("Boards in a batch must all have the same size")
+    layouts = [board.layout_codes() for board in boards]
+    terrain = np.stack([layout[0] for layout in layouts])
+    cities = np.stack([layout[1] for layout in layouts])
+    units = np.stack([board.unit_control for board in boards]).astype(np.int16)
+    batch = BatchBoard(terrain, cities, units)
+    batch.turns[:] = [board.turn for board in boards]
+    return batch
+
+
+def to_board(batch: BatchBoard, game: int) -> grid.Board:
+    cells = [grid.Cell() for _ in range(batch.height * batch.width)]
+    for cell, terrain, city in zip(cells, batch.terrain[game].ravel().tolist(), batch.cities[game].ravel().tolist()):
+        if terrain:
+            cell.type = terrain
+        if city:
+            cell.city = city
+    board = grid.Board([cells[row * batch.width:(row + 1) * batch.width] for row in range(batch.height)])
+    board.populate(batch.units[game])
+    board.turn = int(batch.turns[game])
+    return board
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play random 7-stones self-play games in one vectorized batch.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=200)
+    args = parser.parse_args()
+    start = grid.create_standard_board()
+    grid.place_starter_units(start)
+    batch = from_boards([start] * args.games)
+    began = time.perf_counter()
+    winners = batch.play(args.max_turns, np.random.default_rng(args.seed))
+    seconds = time.perf_counter() - began
+    outcomes = np.bincount(winners, minlength=4) / args.games
+    print(f"{args.games} games in {seconds:.2f}s ({args.games / seconds:.1f} games/sec), "
+          f"mean {batch.turns.mean():.1f} turns | player 1 {outcomes[1]:.1%}, player 2 {outcomes[2]:.1%}, "
+          f"draw {outcomes[3]:.1%}, unfinished {outcomes[0]:.1%}")
@@ -0,0 +1,210 @@
+"""Benchmarks for the rules engine hot paths.
+
+Positions come from seeded generators, so the same arguments time the same
+positions on every revision. Results are written as JSON and two result
+files can be compared to spot regressions:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json
+    python benchmark.py --compare before.json after.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import bitboard
+import grid
+import simulate
+
+DEFAULT_SIZES = (9, 19)
+DEFAULT_DENSITIES = (0.05, 0.2)
+
+
+def generate_position(seed: int, size: int = 9, density: float = 0.1, max_units: int | None = None) -> grid.Board:
+    """A random board with a little of every terrain, one city per player and
+    about ``density`` of the open cells holding a unit of each player.
+
+    Units are placed straight onto the board, so unless ``max_units`` caps
+    them, dense positions may exceed the 7-unit cap of real games.
+    """
+    rng = random.Random(seed)
+    board = grid.Board([[grid.Cell() for _ in range(size)] for _ in range(size)])
+    for cell in board.cells:
+        roll = rng.random()
+        if roll < 0.03:
+            cell.type = grid.Terrain.LAKE
+        elif roll < 0.05:
+            cell.type = grid.Terrain.MOUNTAIN
+        elif roll < 0.08:
+            cell.type = grid.Terrain.FOREST
+    open_cells = [cell for cell in board.cells if cell.type != grid.Terrain.LAKE and cell.type != grid.Terrain.MOUNTAIN]
+    for player in (1, 2):
+        rng.choice(open_cells).city = player
+        count = max(1, round(density * len(open_cells)))
+        if max_units is not None:
+            count = min(count, max_units)
+        for _ in range(count):
+            board.place(grid.Unit(player), rng.choice(open_cells))
+    return board
+
+
+def generate_cascade(seed: int, size: int = 9, attempts: int = 2000) -> grid.Board:
+    """The position with the longest capture cascade among ``attempts``
+    seeded clusters of 7 units per player."""
+    best_rounds, best_seed = -1, seed
+    for attempt in range(seed, seed + attempts):
+        board = _cluster(attempt, size)
+        rounds = bitboard.from_board(board).resolve()
+        if rounds > best_rounds:
+            best_rounds, best_seed = rounds, attempt
+    return _cluster(best_seed, size)
+
+
+def _cluster(seed: int, size: int) -> grid.Board:
+    rng = random.Random(seed)
+    board = grid.Board([[grid.Cell() for _ in range(size)] for _ in range(size)])
+    center_row, center_column = rng.randrange(size), rng.randrange(size)
+    radius = rng.randrange(1, 5)
+    cells = [cell for cell in board.cells if abs(cell.row - center_row) + abs(cell.column - center_column) <= radius]
+    for player in (1, 2):
+        for _ in range(grid.MAX_PLAYER_UNITS):
+            board.place(grid.Unit(player), rng.choice(cells))
+    return board
+
+
+def time_call(function: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """Median seconds per call over ``repeat`` runs of at least ``min_time``."""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+    samples = [elapsed / calls]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        samples.append((time.perf_counter() - start) / calls)
+    return {"seconds_per_call": statistics.median(samples), "calls": calls, "repeat": repeat}
+
+
+def _resolve_copy(board: grid.Board):
+    grid.resolve_units(board.snapshot())
+
+
+def _render(board: grid.Board):
+    with contextlib.redirect_stdout(io.StringIO()):
+        grid.print_player_view(board, 2)
+
+
+def _simulated_turn(board: grid.Board, rng: random.Random):
+    state = board.snapshot()
+    grid.apply_turn(state, simulate.random_policy(state, 1, rng), simulate.random_policy(state, 2, rng))
+    grid.resolve_units(state)
+    grid.check_for_winner(state)
+
+
+def position_benchmarks(board: grid.Board, playable: grid.Board) -> Dict[str, Callable[[], object]]:
+    """Benchmarks on one position; ``playable`` is a variant within the unit
+    cap for the benchmarks that move units."""
+    occupied = sorted({board.unit_cells[unit] for unit in board.unit_cells})
+    cells = [board.cells[index] for index in occupied]
+    rng = random.Random(0)
+    return {
+        "get_cell_control": lambda: [grid.get_cell_control(board, cell) for cell in board.cells],
+        "get_contiguous_controlled_or_contested_cells":
+            lambda: [grid.get_contiguous_controlled_or_contested_cells(board, cell, 1) for cell in cells],
+        "check_for_freedom": lambda: [grid.check_for_freedom(board, cell, player) for cell in cells for player in (1, 2)],
+        "resolve_units": lambda: _resolve_copy(board),
+        "check_for_winner": lambda: grid.check_for_winner(board),
+        "print_player_view": lambda: _render(board),
+        "simulated_turn": lambda: _simulated_turn(playable, rng),
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, densities=DEFAULT_DENSITIES, seed: int = 0, repeat: int = 5,
+              min_time: float = 0.05, cascade_attempts: int = 2000) -> Dict[str, object]:
+    results = {}
+    for size in sizes:
+        for density in densities:
+            board = generate_position(seed, size, density)
+            playable = generate_position(seed, size, density, grid.MAX_PLAYER_UNITS)
+            for name, function in position_benchmarks(board, playable).items():
+                results[f"{name}[size={size},density={density}]"] = time_call(function, repeat, min_time)
+        cascade = generate_cascade(seed, size, cascade_attempts)
+        results[f"resolve_units_cascade[size={size}]"] = time_call(lambda: _resolve_copy(cascade), repeat, min_time)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(before: Dict[str, object], after: Dict[str, object], threshold: float = 0.1) -> List[Dict[str, object]]:
+    """Return one row per benchmark present in both runs, with the ratio of
+    new to old time and whether it regressed by more than ``threshold``."""
+    rows = []
+    for name, old in before["results"].items():
+        new = after["results"].get(name)
+        if new is None:
+            continue
+        ratio = new["seconds_per_call"] / old["seconds_per_call"]
+        rows.append({
+            "name": name,
+            "before": old["seconds_per_call"],
+            "after": new["seconds_per_call"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the 7-stones rules engine.")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--densities", type=float, nargs="+", default=list(DEFAULT_DENSITIES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per timing run")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+    if args.compare:
+        with open(args.compare[0]) as before_file, open(args.compare[1]) as after_file:
+            rows = compare(json.load(before_file), json.load(after_file), args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<70} {_format_seconds(row['before']):>10} {_format_seconds(row['after']):>10} "
+                  f"{row['ratio']:>6.2f}x {flag}")
+        sys.exit(1 if any(row["regression"] for row in rows) else 0)
+    report = run_suite(args.sizes, args.densities, args.seed, args.repeat, args.min_time)
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    for name, result in report["results"].items():
+        print(f"{name:<70} {_format_seconds(result['seconds_per_call']):>10}")
@@ -0,0 +1,232 @@
+"""Bitboard representation of a 7-stones position.
+
+Every per-cell flag of the board (terrain, cities, occupancy, control) is a
+single Python int with bit ``row * width + column`` standing for that cell.
+Unit counts are stored bit-sliced: ``units[player][bit]`` holds bit ``bit``
+of the number of that player's units on every cell, so summing the control
+of a cell and its neighbors is a handful of shifts and full adders over
+whole-board ints instead of a loop over cells.
+
+The rules implemented here match ``grid.resolve_units`` and
+``grid.check_for_winner`` for boards whose units all have a control of 1,
+which is what ``grid.Unit`` uses.
+"""
+from typing import Dict, List, Tuple
+
+import grid
+
+
+class BitBoard():
+    def __init__(self, height: int, width: int, bits: int):
+        self.height = height
+        self.width = width
+        self.bits = bits
+        self.full = (1 << (height * width)) - 1
+        first_column = 0
+        for row in range(height):
+            first_column |= 1 << (row * width)
+        last_column = first_column << (width - 1)
+        self.not_first_column = self.full & ~first_column
+        self.not_last_column = self.full & ~last_column
+        self.lake = 0
+        self.mountain = 0
+        self.forest = 0
+        self.cities: Dict[int, int] = {1: 0, 2: 0}
+        self.units: Dict[int, List[int]] = {1: [0] * bits, 2: [0] * bits}
+
+    def bit(self, row: int, column: int) -> int:
+        return 1 << (row * self.width + column)
+
+    @property
+    def blocked(self) -> int:
+        return self.lake | self.mountain
+
+    def occupied(self, player: int) -> int:
+        mask = 0
+        for plane in self.units[player]:
+            mask |= plane
+        return mask
+
+    def unit_count(self, row: int, column: int, player: int) -> int:
+        index = row * self.width + column
+        return sum(((plane >> index) & 1) << bit for bit, plane in enumerate(self.units[player]))
+
+    def copy(self) -> "BitBoard":
+        other = BitBoard.__new__(BitBoard)
+        other.__dict__.update(self.__dict__)
+        other.cities = dict(self.cities)
+        other.units = {player: list(planes) for player, planes in self.units.items()}
+        return other
+
+    def _shifts(self, mask: int) -> Tuple[int, int, int, int]:
+        """Return ``mask`` moved so each cell sees the bit of its lower, upper,
+        right and left neighbor."""
+        return (mask >> self.width,
+                (mask << self.width) & self.full,
+                (mask >> 1) & self.not_last_column,
+                (mask << 1) & self.not_first_column)
+
+    def dilate(self, mask: int) -> int:
+        below, above, right, left = self._shifts(mask)
+        return mask | below | above | right | left
+
+    def fill(self, seed: int, within: int) -> int:
+        """Grow ``seed`` through orthogonally connected cells of ``within``."""
+        region = seed & within
+        while True:
+            grown = self.dilate(region) & within
+            if grown == region:
+                return region
+            region = grown
+
+    def influence(self, player: int) -> List[int]:
+        """Bit-sliced control the player exerts on every cell."""
+        planes = self.units[player]
+        total = list(planes)
+        shifted = [self._shifts(plane) for plane in planes]
+        for direction in range(4):
+            total = _add(total, [shifts[direction] for shifts in shifted])
+        return total
+
+    def control_masks(self) -> Dict[str, int]:
+        """Return the masks of cells controlled by each player, contested
+        cells and cells nobody has influence over."""
+        player_1 = self.influence(1)
+        player_2 = self.influence(2)
+        player_1_ahead, equal = _compare(player_1, player_2, self.full)
+        player_2_ahead, _ = _compare(player_2, player_1, self.full)
+        influenced = 0
+        for plane in player_1 + player_2:
+            influenced |= plane
+        no_influence = self.full & ~influenced & ~(self.cities[1] | self.cities[2])
+        return {
+            "player_1": player_1_ahead,
+            "player_2": player_2_ahead,
+            "contested": equal & ~no_influence,
+            "none": no_influence,
+        }
+
+    def free(self, player: int, masks: Dict[str, int] | None = None) -> int:
+        """Mask of the cells whose units of ``player`` have freedom."""
+        if masks is None:
+            masks = self.control_masks()
+        controlled_or_contested = masks["player_1" if player == 1 else "player_2"] | masks["contested"]
+        touching_liberty = controlled_or_contested & self.dilate(masks["none"])
+        return self.fill(touching_liberty, controlled_or_contested)
+
+    def control_grid(self) -> List[List[int | None]]:
+        """Control values laid out like ``grid.get_cell_control`` returns them."""
+        player_1 = self.influence(1)
+        player_2 = self.influence(2)
+        cities = self.cities[1] | self.cities[2]
+        rows = []
+        for row in range(self.height):
+            values = []
+            for column in range(self.width):
+                index = row * self.width + column
+                player_1_control = _decode(player_1, index)
+                player_2_control = _decode(player_2, index)
+                if player_1_control == 0 and player_2_control == 0 and not (cities >> index) & 1:
+                    values.append(None)
+                else:
+                    values.append(player_1_control - player_2_control)
+            rows.append(values)
+        return rows
+
+    def resolve(self) -> int:
+        """Remove units without freedom until stable, like ``grid.resolve_units``.
+
+        Returns the number of rounds, counting the last one that removed
+        nothing.
+        """
+        rounds = 0
+        while True:
+            rounds += 1
+            masks = self.control_masks()
+            dead = {player: self.occupied(player) & ~self.free(player, masks) for player in (1, 2)}
+            if not dead[1] and not dead[2]:
+                return rounds
+            for player in (1, 2):
+                keep = ~dead[player]
+                self.units[player] = [plane & keep for plane in self.units[player]]
+
+    def winner(self) -> int | None:
+        """Same result as ``grid.check_for_winner``."""
+        masks = self.control_masks()
+        winners = []
+        for player in (1, 2):
+            captured = self.cities[player] & ~self.free(player, masks)
+            winners.extend([grid.get_opposing_player(player)] * captured.bit_count())
+        if len(winners) == 1:
+            return winners[0]
+        elif len(winners) == 2:
+            return 3
+        return None
+
+
+def _add(left: List[int], right: List[int]) -> List[int]:
+    """Bit-sliced addition; the caller sizes the planes so nothing overflows."""
+    total = []
+    carry = 0
+    for left_plane, right_plane in zip(left, right):
+        partial = left_plane ^ right_plane
+        total.append(partial ^ carry)
+        carry = (left_plane & right_plane) | (carry & partial)
+    return total
+
+
+def _compare(left: List[int], right: List[int], full: int) -> Tuple[int, int]:
+    """Return the masks where ``left > right`` and where they are equal."""
+    greater = 0
+    equal = full
+    for left_plane, right_plane in zip(reversed(left), reversed(right)):
+        greater |= equal & left_plane & ~right_plane
+        equal &= ~(left_plane ^ right_plane)
+    return greater, equal & full
+
+
+def _decode(planes: List[int], index: int) -> int:
+    return sum(((plane >> index) & 1) << bit for bit, plane in enumerate(planes))
+
+
+def from_board(board: grid.Board) -> BitBoard:
+    for unit in board.unit_cells:
+        if unit.control != 1:
+            raise ValueError("BitBoard only supports units with a control of 1")
+    most_units = max(grid.MAX_PLAYER_UNITS, *(board.unit_count(player) for player in (1, 2)))
+    bitboard = BitBoard(board.height, board.width, most_units.bit_length())
+    for cell in board.cells:
+        bit = 1 << cell.index
+        if cell.type == grid.Terrain.LAKE:
+            bitboard.lake |= bit
+        elif cell.type == grid.Terrain.MOUNTAIN:
+            bitboard.mountain |= bit
+        elif cell.type == grid.Terrain.FOREST:
+            bitboard.forest |= bit
+        if cell.city:
+            bitboard.cities[cell.city] |= bit
+    for player in (1, 2):
+        planes = bitboard.units[player]
+        for count_index, count in enumerate(board.unit_control[player - 1].ravel().tolist()):
+            for bit in range(bitboard.bits):
+                if (count >> bit) & 1:
+                    planes[bit] |= 1 << count_index
+    return bitboard
+
+
+def to_board(bitboard: BitBoard) -> grid.Board:
+    board = grid.Board([[grid.Cell() for _ in range(bitboard.width)] for _ in range(bitboard.height)])
+    for cell in board.cells:
+        bit = 1 << cell.index
+        if bitboard.lake & bit:
+            cell.type = grid.Terrain.LAKE
+        elif bitboard.mountain & bit:
+            cell.type = grid.Terrain.MOUNTAIN
+        elif bitboard.forest & bit:
+            cell.type = grid.Terrain.FOREST
+        for player in (1, 2):
+            if bitboard.cities[player] & bit:
+                cell.city = player
+            for _ in range(_decode(bitboard.units[player], cell.index)):
+                board.place(grid.Unit(player), cell)
+    return board
@@ -0,0 +1,225 @@
+"""Differential fuzzing of the rules engines against ``reference``.
+
+Seeded random games give a stream of positions: each game starts from
+``benchmark.generate_position`` and plays random moves for both players,
+and every position is compared as it stands after the moves and before
+they are resolved. For each position, an engine reports an ``Outcome``:
+
+- the control of every cell, as ``get_cell_control`` returns it,
+- the freedom of every player's units and cities,
+- the units left on every cell once the position is resolved,
+- and the winner of the resolved position.
+
+Engines are functions taking a list of boards of the same size and
+returning their outcomes, registered with ``@engine(name)``; they must not
+change the boards. ``grid``, ``bitboard`` and ``batchboard`` are
+registered here. Every outcome is compared with the frozen reference
+rules, and the run reports the mismatches and each engine's throughput:
+
+    python fuzz.py --games 200 --turns 20
+    python fuzz.py --games 100000 --no-reference  # engines against each other
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import batchboard
+import benchmark
+import bitboard
+import grid
+import reference
+import simulate
+
+FIELDS = ("control", "freedom", "resolved", "winner")
+
+Engine = Callable[[List[grid.Board]], List["Outcome"]]
+ENGINES: Dict[str, Engine] = {}
+
+
+class Outcome():
+    def __init__(self, control: List[int | None], freedom: Dict[Tuple[int, int], bool],
+                 resolved: List[Tuple[int, int]], winner: int | None):
+        self.control = control
+        self.freedom = freedom
+        self.resolved = resolved
+        self.winner = winner
+
+    def differences(self, other: "Outcome") -> List[str]:
+        return [field for field in FIELDS if getattr(self, field) != getattr(other, field)]
+
+
+class Mismatch():
+    def __init__(self, engine: str, seed: int, turn: int, field: str, expected, actual):
+        self.engine = engine
+        self.seed = seed
+        self.turn = turn
+        self.field = field
+        self.expected = expected
+        self.actual = actual
+
+    def __repr__(self):
+        return (f"Mismatch({self.engine!r}, seed={self.seed}, turn={self.turn}, field={self.field!r}, "
+                f"expected={self.expected!r}, actual={self.actual!r})")
+
+
+def engine(name: str):
+    def register(function: Engine) -> Engine:
+        ENGINES[name] = function
+        return function
+    return register
+
+
+def _checked_cells(board: grid.Board) -> List[Tuple[int, int]]:
+    """The ``(cell index, player)`` pairs whose freedom the rules look at:
+    cells holding units of the player and the player's cities."""
+    pairs = {(board.unit_cells[unit], unit.player) for unit in board.unit_cells}
+    pairs.update((cell.index, cell.city) for cell in board.cells if cell.city)
+    return sorted(pairs)
+
+
+def _unit_counts(cells) -> List[Tuple[int, int]]:
+    return [(sum(1 for unit in cell.units if unit.player == 1), sum(1 for unit in cell.units if unit.player == 2))
+            for cell in cells]
+
+
+def reference_outcome(board: grid.Board) -> Outcome:
+    rows = reference.from_board(board)
+    cells = [cell for row in rows for cell in row]
+    control = [reference.get_cell_control(rows, cell) for cell in cells]
+    freedom = {(index, player): reference.check_for_freedom(rows, cells[index], player)
+               for index, player in _checked_cells(board)}
+    reference.resolve_units(rows)
+    return Outcome(control, freedom, _unit_counts(cells), reference.check_for_winner(rows))
+
+
+@engine("grid")
+def grid_outcomes(boards: List[grid.Board]) -> List[Outcome]:
+    outcomes = []
+    for board in boards:
+        control = [grid.get_cell_control(board, cell) for cell in board.cells]
+        regions = {player: grid.label_regions(board, player) for player in (1, 2)}
+        freedom = {(index, player): grid.check_for_freedom(board, board.cells[index], player, regions[player])
+                   for index, player in _checked_cells(board)}
+        resolved = board.snapshot()
+        grid.resolve_units(resolved)
+        outcomes.append(Outcome(control, freedom, _unit_counts(resolved.cells), grid.check_for_winner(resolved)))
+    return outcomes
+
+
+@engine("bitboard")
+def bitboard_outcomes(boards: List[grid.Board]) -> List[Outcome]:
+    outcomes = []
+    for board in boards:
+        engine = bitboard.from_board(board)
+        control = [value for row in engine.control_grid() for value in row]
+        masks = engine.control_masks()
+        free = {player: engine.free(player, masks) for player in (1, 2)}
+        freedom = {(index, player): bool((free[player] >> index) & 1) for index, player in _checked_cells(board)}
+        engine.resolve()
+        resolved = [(engine.unit_count(row, column, 1), engine.unit_count(row, column, 2))
+                    for row in range(board.height) for column in range(board.width)]
+        outcomes.append(Outcome(control, freedom, resolved, engine.winner()))
+    return outcomes
+
+
+@engine("batchboard")
+def batchboard_outcomes(boards: List[grid.Board]) -> List[Outcome]:
+    batch = batchboard.from_boards(boards)
+    signed, no_influence = batch.control()
+    free = batch.free().reshape(len(boards), 2, -1)
+    signed = signed.reshape(len(boards), -1).tolist()
+    no_influence = no_influence.reshape(len(boards), -1).tolist()
+    batch.resolve()
+    units = batch.units.reshape(len(boards), 2, -1)
+    winners = batch.winner().tolist()
+    outcomes = []
+    for game, board in enumerate(boards):
+        control = [None if empty else value for value, empty in zip(signed[game], no_influence[game])]
+        freedom = {(index, player): bool(free[game, player - 1, index]) for index, player in _checked_cells(board)}
+        resolved = list(zip(units[game, 0].tolist(), units[game, 1].tolist()))
+        outcomes.append(Outcome(control, freedom, resolved, winners[game] or None))
+    return outcomes
+
+
+def positions(games: int, turns: int, seed: int = 0, size: int = 9) -> Iterator[Tuple[int, int, grid.Board]]:
+    """Yield ``(game seed, turn, board)`` for every position of ``games``
+    random games of ``turns`` turns, each position before it is resolved.
+    Games start with between 1 and 12 units per player, so some go past
+    the unit cap of real games."""
+    for game_seed in range(seed, seed + games):
+        rng = random.Random(game_seed)
+        board = benchmark.generate_position(game_seed, size, rng.uniform(0.02, 0.3), rng.randint(1, 12))
+        for turn in range(turns + 1):
+            if turn:
+                grid.resolve_units(board)
+                if grid.check_for_winner(board) is not None:
+                    break
+                grid.apply_turn(board, simulate.random_policy(board, 1, rng), simulate.random_policy(board, 2, rng))
+            yield game_seed, turn, board.snapshot()
+
+
+class FuzzReport():
+    def __init__(self, positions: int, seconds: Dict[str, float], mismatches: List[Mismatch]):
+        self.positions = positions
+        self.seconds = seconds
+        self.mismatches = mismatches
+
+    def throughput(self, name: str) -> float:
+        return self.positions / self.seconds[name] if self.seconds[name] else float("inf")
+
+    def summary(self) -> str:
+        baseline = "reference" if "reference" in self.seconds else next(iter(self.seconds))
+        lines = [f"{self.positions} positions, {len(self.mismatches)} mismatches"]
+        for name in self.seconds:
+            speedup = self.throughput(name) / self.throughput(baseline)
+            lines.append(f"{name:<12} {self.throughput(name):>12.1f} positions/sec {speedup:>10.1f}x")
+        for mismatch in self.mismatches[:20]:
+            lines.append(repr(mismatch))
+        return "\n".join(lines)
+
+
+def run(engines: List[str] | None = None, games: int = 100, turns: int = 20, seed: int = 0, size: int = 9,
+        batch: int = 256, use_reference: bool = True) -> FuzzReport:
+    """Compare the engines on every generated position, ``batch`` positions
+    at a time. Without the reference, the first engine is the one the
+    others are compared with."""
+    names = list(ENGINES) if engines is None else engines
+    expected_name = "reference" if use_reference else names[0]
+    seconds = {name: 0.0 for name in ([expected_name] + [name for name in names if name != expected_name])}
+    mismatches = []
+    count = 0
+    stream = positions(games, turns, seed, size)
+    while True:
+        chunk = [position for _, position in zip(range(batch), stream)]
+        if not chunk:
+            break
+        count += len(chunk)
+        boards = [board for _, _, board in chunk]
+        results = {}
+        for name in seconds:
+            start = time.perf_counter()
+            results[name] = [reference_outcome(board) for board in boards] if name == "reference" else ENGINES[name](boards)
+            seconds[name] += time.perf_counter() - start
+        for name, outcomes in results.items():
+            if name == expected_name:
+                continue
+            for (game_seed, turn, _), expected, actual in zip(chunk, results[expected_name], outcomes):
+                for field in expected.differences(actual):
+                    mismatches.append(Mismatch(name, game_seed, turn, field, getattr(expected, field), getattr(actual, field)))
+    return FuzzReport(count, seconds, mismatches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the 7-stones engines with the reference rules on random positions.")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=None, help="engines to check; all by default")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20, help="turns of random moves per game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=9)
+    parser.add_argument("--batch", type=int, default=256, help="positions handed to the engines at a time")
+    parser.add_argument("--no-reference", action="store_true", help="compare the engines with the first one only")
+    args = parser.parse_args()
+    report = run(args.engines, args.games, args.turns, args.seed, args.size, args.batch, not args.no_reference)
+    print(report.summary())
+    raise SystemExit(1 if report.mismatches else 0)
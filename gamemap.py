@@ -0,0 +1,135 @@
+"""Loadable map files.
+
+A map file is a few ``key value`` header lines followed by the board, one
+line per row and one character per cell::
+
+    # comments start with a hash
+    name standard
+    zone 3
+    ..2222222
+    .......B.
+    ..f...~..
+
+Cells are ``.`` plain, ``f`` forest, ``~`` lake and ``^`` mountain. ``A`` and
+``B`` are plains holding a city of player 1 and player 2, and ``1`` and ``2``
+are plains holding a starting unit of that player. ``zone`` is how many rows
+from their own edge each player may build cities and place units in during
+setup; player 1 sits at the bottom edge and player 2 at the top.
+
+The loader precomputes the neighbor and mirror tables once per map, so every
+board created from it shares them.
+"""
+from functools import cache
+import os
+from typing import Dict, List, Tuple
+
+MAPS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+STANDARD_MAP = os.path.join(MAPS_DIRECTORY, "standard.map")
+
+TERRAIN = {".": "plain", "f": "forest", "~": "lake", "^": "mountain"}
+CITIES = {"A": 1, "B": 2}
+UNITS = {"1": 1, "2": 2}
+SYMBOLS = {terrain: symbol for symbol, terrain in TERRAIN.items()}
+
+
+class GameMap():
+    def __init__(self, name: str, terrain: List[List[str]], cities: Dict[int, int] | None = None,
+                 units: List[Tuple[int, int]] | None = None, zone: int = 3):
+        self.name = name
+        self.height = len(terrain)
+        self.width = len(terrain[0])
+        if any(len(row) != self.width for row in terrain):
+            raise ValueError("All map rows must have the same width")
+        if not 0 < zone <= self.height:
+            raise ValueError("Map zone must be between 1 and the map height")
+        self.terrain = [cell for row in terrain for cell in row]
+        self.cities = dict(cities or {})
+        self.units = list(units or [])
+        self.zone = zone
+        self.neighbors = neighbor_table(self.height, self.width)
+        self.mirror = mirror_table(self.height, self.width)
+
+    def dumps(self) -> str:
+        """The map in the file format read by ``parse_map``."""
+        symbols = [SYMBOLS[terrain] for terrain in self.terrain]
+        for index, player in self.cities.items():
+            symbols[index] = "A" if player == 1 else "B"
+        for index, player in self.units:
+            symbols[index] = str(player)
+        lines = [f"name {self.name}", f"zone {self.zone}"]
+        lines.extend("".join(symbols[row * self.width:(row + 1) * self.width]) for row in range(self.height))
+        return "\n".join(lines) + "\n"
+
+
+def neighbor_table(height: int, width: int) -> List[Tuple[int, ...]]:
+    """Flat indices of the orthogonal neighbors of every cell."""
+    table = []
+    for index in range(height * width):
+        row, column = divmod(index, width)
+        neighbors = []
+        if row > 0:
+            neighbors.append(index - width)
+        if row < height - 1:
+            neighbors.append(index + width)
+        if column > 0:
+            neighbors.append(index - 1)
+        if column < width - 1:
+            neighbors.append(index + 1)
+        table.append(tuple(neighbors))
+    return table
+
+
+def mirror_table(height: int, width: int) -> List[int]:
+    """Flat index of every cell as seen from the other side of the board."""
+    last = height * width - 1
+    return [last - index for index in range(height * width)]
+
+
+def parse_map(text: str, name: str = "unnamed") -> GameMap:
+    header = {"name": name, "zone": "3"}
+    rows = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if " " in line:
+            if rows:
+                raise ValueError(f"Line {line_number}: header line after the board")
+            key, value = line.split(None, 1)
+            header[key] = value
+            continue
+        rows.append(line)
+    if not rows:
+        raise ValueError("Map has no board")
+    terrain = []
+    cities = {}
+    units = []
+    width = len(rows[0])
+    for row_index, row in enumerate(rows):
+        if len(row) != width:
+            raise ValueError(f"Row {row_index} is {len(row)} cells wide, expected {width}")
+        terrain_row = []
+        for column_index, symbol in enumerate(row):
+            index = row_index * width + column_index
+            if symbol in TERRAIN:
+                terrain_row.append(TERRAIN[symbol])
+            elif symbol in CITIES:
+                terrain_row.append("plain")
+                cities[index] = CITIES[symbol]
+            elif symbol in UNITS:
+                terrain_row.append("plain")
+                units.append((index, UNITS[symbol]))
+            else:
+                raise ValueError(f"Unknown map symbol {symbol!r} at row {row_index}, column {column_index}")
+        terrain.append(terrain_row)
+    return GameMap(header["name"], terrain, cities, units, int(header["zone"]))
+
+
+def load_map(path: str) -> GameMap:
+    with open(path) as map_file:
+        return parse_map(map_file.read(), os.path.splitext(os.path.basename(path))[0])
+
+
+@cache
+def standard_map() -> GameMap:
+    return load_map(STANDARD_MAP)
@@ -0,0 +1,259 @@
+"""Game records and append-only game archives.
+
+A ``GameRecord`` holds everything needed to replay a game: the map with its
+cities, the units on the board before the first turn and, for every turn,
+the simultaneous moves of both players as ``(player, source, target)`` cell
+indices. Units of a player standing on the same cell are interchangeable,
+so a move names the cell a unit leaves rather than the unit itself, and
+units staying where they are are not recorded.
+
+An archive file starts with ``MAGIC`` and holds one block per game::
+
+    header      block length, index width, winner, map bytes, placements, turns
+    map         the map text of ``gamemap.GameMap.dumps``, without units
+    placements  cell indices, then the player of each
+    offsets     one u32 per turn: where the turn starts within the block
+    turns       per turn the number of player 1 and player 2 moves, then
+                the source and target index of each move
+
+Integers are little-endian. Cell indices take 2 bytes, or 4 in games on
+boards of more than 65536 cells. ``read_games`` streams the games of an archive one
+block at a time, and ``Archive`` memory-maps it for random access to any
+game or turn.
+"""
+import mmap
+import os
+import struct
+from typing import Iterator, List, Tuple
+
+import gamemap
+import grid
+
+MAGIC = b"7STONES\x01"
+Move = Tuple[int, int, int]
+
+# Block length, index width, winner (0 for none), map bytes, placements, turns.
+_HEADER = struct.Struct("<IBBIII")
+_TURN = struct.Struct("<HH")
+_OFFSET = struct.Struct("<I")
+
+
+class GameRecord():
+    def __init__(self, map_text: str, placements: List[Tuple[int, int]], turns: List[List[Move]] | None = None,
+                 winner: int | None = None):
+        self.map_text = map_text
+        self.placements = placements
+        self.turns = turns if turns is not None else []
+        self.winner = winner
+
+    def start_board(self) -> grid.Board:
+        game_map = gamemap.parse_map(self.map_text)
+        board = grid.create_board(game_map)
+        grid.place_map_start(board, game_map)
+        for index, player in self.placements:
+            grid.add_unit(board, grid.Unit(player), board.cells[index])
+        return board
+
+    def __eq__(self, other):
+        return (self.map_text, self.placements, self.turns, self.winner) == \
+            (other.map_text, other.placements, other.turns, other.winner)
+
+    def __repr__(self):
+        return f"GameRecord(turns={len(self.turns)}, winner={self.winner})"
+
+
+class GameRecorder():
+    """Builds a ``GameRecord`` while a game is played.
+
+    Create it once the units are placed and call ``record_turn`` with each
+    turn's moves before they are applied.
+    """
+    def __init__(self, board: grid.Board):
+        self.record = GameRecord(board_map(board).dumps(),
+                                 [(board.unit_cells[unit], unit.player) for unit in grid.get_player_units(board, 1)] +
+                                 [(board.unit_cells[unit], unit.player) for unit in grid.get_player_units(board, 2)])
+
+    def record_turn(self, board: grid.Board, player_moves: List[Tuple[grid.Unit, grid.Cell]]):
+        moves = [(unit.player, board.unit_cells[unit], target_cell.index) for unit, target_cell in player_moves
+                 if board.unit_cells[unit] != target_cell.index]
+        moves.sort(key=lambda move: move[0])
+        self.record.turns.append(moves)
+
+    def finish(self, winner: int | None) -> GameRecord:
+        self.record.winner = winner
+        return self.record
+
+
+def board_map(board: grid.Board) -> gamemap.GameMap:
+    """The map of a board: its terrain, cities and setup zone, without units."""
+    terrain = [[cell.type.name.lower() for cell in row] for row in board]
+    cities = {cell.index: cell.city for cell in board.cells if cell.city}
+    return gamemap.GameMap("recorded", terrain, cities, zone=board.zone)
+
+
+def apply_recorded_turn(board: grid.Board, moves: List[Move]):
+    """Apply one recorded turn and resolve it, as the turn loop does."""
+    moved = set()
+    player_moves = {1: [], 2: []}
+    for player, source, target in moves:
+        unit = next(unit for unit in board.cells[source].units if unit.player == player and unit not in moved)
+        moved.add(unit)
+        player_moves[player].append((unit, board.cells[target]))
+    grid.apply_turn(board, player_moves[1], player_moves[2])
+    grid.resolve_units(board)
+
+
+def replay(record: GameRecord) -> Iterator[grid.Board]:
+    """Yield the board after each turn of the game. The same board object is
+    updated in place; snapshot it to keep a position."""
+    board = record.start_board()
+    for moves in record.turns:
+        apply_recorded_turn(board, moves)
+        yield board
+
+
+def encode(record: GameRecord) -> bytes:
+    map_bytes = record.map_text.encode()
+    largest = max((index for move in record.turns for _, *indices in move for index in indices), default=0)
+    largest = max([largest, *(index for index, _ in record.placements)])
+    width = 2 if largest < 1 << 16 else 4
+    code = "H" if width == 2 else "I"
+    placements = struct.pack(f"<{len(record.placements)}{code}{len(record.placements)}B",
+                             *(index for index, _ in record.placements), *(player for _, player in record.placements))
+    turns = []
+    for moves in record.turns:
+        player_1_moves = sum(1 for player, _, _ in moves if player == 1)
+        indices = [index for _, source, target in moves for index in (source, target)]
+        turns.append(_TURN.pack(player_1_moves, len(moves) - player_1_moves) + struct.pack(f"<{len(indices)}{code}", *indices))
+    offset = _HEADER.size + len(map_bytes) + len(placements) + _OFFSET.size * len(turns)
+    offsets = []
+    for turn in turns:
+        offsets.append(offset)
+        offset += len(turn)
+    header = _HEADER.pack(offset, width, record.winner or 0, len(map_bytes), len(record.placements), len(turns))
+    return b"".join([header, map_bytes, placements, struct.pack(f"<{len(offsets)}I", *offsets), *turns])
+
+
+def decode(block) -> GameRecord:
+    """Decode one game block from any buffer starting at the block."""
+    length, width, winner, map_length, placement_count, turn_count = _HEADER.unpack_from(block)
+    code = "H" if width == 2 else "I"
+    offset = _HEADER.size
+    map_text = bytes(block[offset:offset + map_length]).decode()
+    offset += map_length
+    indices = struct.unpack_from(f"<{placement_count}{code}", block, offset)
+    offset += placement_count * width
+    players = struct.unpack_from(f"<{placement_count}B", block, offset)
+    offset += placement_count
+    turn_offsets = struct.unpack_from(f"<{turn_count}I", block, offset)
+    turns = [_decode_turn(block, turn_offset, width) for turn_offset in turn_offsets]
+    return GameRecord(map_text, list(zip(indices, players)), turns, winner or None)
+
+
+def _decode_turn(block, offset: int, width: int) -> List[Move]:
+    player_1_moves, player_2_moves = _TURN.unpack_from(block, offset)
+    count = player_1_moves + player_2_moves
+    indices = struct.unpack_from(f"<{2 * count}{'H' if width == 2 else 'I'}", block, offset + _TURN.size)
+    return [(1 if move < player_1_moves else 2, indices[2 * move], indices[2 * move + 1]) for move in range(count)]
+
+
+class ArchiveWriter():
+    """Appends games to an archive file, creating it if needed."""
+    def __init__(self, path: str):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def write(self, record: GameRecord):
+        self.file.write(encode(record))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_magic(magic: bytes, path: str):
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a game archive")
+
+
+def read_games(path: str) -> Iterator[GameRecord]:
+    """Stream the games of an archive, reading one block at a time."""
+    with open(path, "rb") as archive:
+        _check_magic(archive.read(len(MAGIC)), path)
+        while True:
+            header = archive.read(_HEADER.size)
+            if not header:
+                return
+            length = _HEADER.unpack(header)[0]
+            yield decode(header + archive.read(length - _HEADER.size))
+
+
+def replay_archive(path: str) -> Iterator[Tuple[GameRecord, grid.Board]]:
+    """Replay every game of an archive, yielding each record with its final board."""
+    for record in read_games(path):
+        board = record.start_board()
+        for moves in record.turns:
+            apply_recorded_turn(board, moves)
+        yield record, board
+
+
+class Archive():
+    """Random access to the games of a memory-mapped archive.
+
+    Game offsets are found by hopping over the block lengths on first use;
+    only the blocks that are asked for are decoded.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        _check_magic(bytes(self._map[:len(MAGIC)]), path)
+        self._offsets = None
+
+    @property
+    def offsets(self) -> List[int]:
+        if self._offsets is None:
+            offsets = []
+            offset = len(MAGIC)
+            while offset < len(self._map):
+                offsets.append(offset)
+                offset += _OFFSET.unpack_from(self._map, offset)[0]
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _block(self, game: int) -> memoryview:
+        offset = self.offsets[game]
+        length = _OFFSET.unpack_from(self._map, offset)[0]
+        return memoryview(self._map)[offset:offset + length]
+
+    def __getitem__(self, game: int) -> GameRecord:
+        return decode(self._block(game))
+
+    def turn(self, game: int, turn: int) -> List[Move]:
+        """The moves of one turn, without decoding the rest of the game."""
+        block = self._block(game)
+        _, width, _, map_length, placement_count, turn_count = _HEADER.unpack_from(block)
+        if not 0 <= turn < turn_count:
+            raise IndexError("turn out of range")
+        table = _HEADER.size + map_length + placement_count * (width + 1)
+        return _decode_turn(block, _OFFSET.unpack_from(block, table + turn * _OFFSET.size)[0], width)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,403 +1,1415 @@
+import argparse
+from collections import Counter, OrderedDict
+from enum import IntEnum
 from functools import cache
+import hashlib
+import itertools
 import os
-import copy
-from typing import List, Set, Tuple
-import uuid
+import sys
+import weakref
+from typing import Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+import gamemap
+import instrument
+
+MAX_PLAYER_UNITS = 7
+
+# Identifiers of cells and units; unique within a process.
+_next_id = itertools.count().__next__
+# Layout versions are unique within a process too, so caches shared between
+# a board and its snapshots never mistake one board's layout for another's.
+_next_layout_version = itertools.count().__next__
+
+class Terrain(IntEnum):
+    PLAIN = 0
+    FOREST = 1
+    LAKE = 2
+    MOUNTAIN = 3
 
 class Cell():
+    __slots__ = ("_type", "_city", "units", "id", "row", "column", "index", "owner", "stamp")
+
     def __init__(self):
-        self.type = "plain"
-        self.city = None
+        self._type = Terrain.PLAIN
+        self._city = None
         self.units = []
-        self.visible = True
-        self.uuid = uuid.uuid4()
+        self.id = _next_id()
+        # Set by the Board the cell is placed on.
+        self.row = None
+        self.column = None
+        self.index = None
+        self.owner = None
+        # The owner's snapshot count when the cell was last copied for the
+        # boards sharing it; see ``Board._hand_over``.
+        self.stamp = 0
+
+    @property
+    def type(self) -> Terrain:
+        return self._type
+
+    @type.setter
+    def type(self, value: "Terrain | str"):
+        """Accepts a Terrain or its name, such as "forest"."""
+        value = Terrain[value.upper()] if isinstance(value, str) else Terrain(value)
+        self._before_layout_write()
+        self._type = value
+
+    @property
+    def city(self) -> int | None:
+        return self._city
+
+    @city.setter
+    def city(self, value: int | None):
+        self._before_layout_write()
+        self._city = value
+
+    def _before_layout_write(self):
+        # Let the board owning the cell copy it for the boards sharing it and
+        # mark its cached layout data stale.
+        owner = self.owner
+        board = owner.board() if owner is not None else None
+        if board is not None and board._owner is owner:
+            board._layout_write(self)
+
+    def clone(self) -> "Cell":
+        cell = Cell.__new__(Cell)
+        cell._type = self._type
+        cell._city = self._city
+        cell.units = list(self.units)
+        cell.id = self.id
+        cell.row = self.row
+        cell.column = self.column
+        cell.index = self.index
+        cell.owner = self.owner
+        cell.stamp = self.stamp
+        return cell
 
     def __eq__(self, other):
-        return self.uuid == other.uuid
-    
+        return self is other or self.id == other.id
+
     def __hash__(self):
-        return hash(self.uuid)
+        return self.id
 
 class Unit():
+    __slots__ = ("player", "id")
     movement = 1
     control = 1
     vision = 1
     def __init__(self, player):
         self.player = player
-        self.uuid = uuid.uuid4()
-    
+        self.id = _next_id()
+
     def __eq__(self, other):
-        return self.uuid == other.uuid
+        return self is other or self.id == other.id
+
+    def __hash__(self):
+        return self.id
 
-def get_cell_position(board: List[List[Cell]], cell: Cell):
-    for row_index, row in enumerate(board):
-        for column_index, current_cell in enumerate(row):
-            if current_cell == cell:
-                return row_index, column_index
-    raise ValueError("Cell not found on board")
+class _Owner():
+    """Marks the cells a board may change in place; see ``Board.snapshot``."""
+    __slots__ = ("board",)
 
-def get_adjacent_cells(board: List[List[Cell]], cell: Cell) -> Set[Cell]:
-    adjacent_cells = set()
-    row, column = get_cell_position(board, cell)
-    if row > 0:
-        adjacent_cells.add(board[row-1][column])
-    if row < len(board) - 1:
-        adjacent_cells.add(board[row+1][column])
-    if column > 0:
-        adjacent_cells.add(board[row][column-1])
-    if column < len(board[0]) - 1:
-        adjacent_cells.add(board[row][column+1])
-    return adjacent_cells
-
-def get_cells_adjacent_to_set(board: List[List[Cell]], cells: Set[Cell]) -> Set[Cell]:
+    def __init__(self, board: "Board"):
+        self.board = weakref.ref(board)
+
+class Board():
+    """A rectangular grid of cells, stored row-major in ``cells``, that
+    indexes its units.
+
+    Add, move and remove units only through ``place`` and ``lift`` (or the
+    module helpers) so that ``unit_cells``, ``player_units``,
+    ``unit_control``, ``influence`` and ``zobrist`` stay in sync.
+    ``snapshot`` returns a cheap copy-on-write copy. ``board[row][column]``,
+    ``cell``, ``unit_cell`` and ``adjacent`` return cells the board owns;
+    write terrain and cities only through those.
+    """
+    debug = False
+
+    def __init__(self, grid: List[List[Cell]], neighbors: List[Tuple[int, ...]] | None = None,
+                 mirror: List[int] | None = None, zone: int = 3):
+        self.height = len(grid)
+        self.width = len(grid[0])
+        self.cells = [cell for row in grid for cell in row]
+        # Cells the board may change in place carry its owner marker.
+        self._owner = _Owner(self)
+        # True while the containers below may be shared with a snapshot.
+        self._shared = False
+        # Counts the snapshots taken; see ``_hand_over``.
+        self._epoch = 0
+        # Every board that may share cells with this one.
+        self._family = weakref.WeakSet([self])
+        self._frozen = False
+        # Caches derived from terrain and cities are keyed on this version,
+        # which changes whenever one of the board's own cells is rewritten.
+        self._layout_version = _next_layout_version()
+        for index, cell in enumerate(self.cells):
+            cell.row, cell.column = divmod(index, self.width)
+            cell.index = index
+            cell.owner = self._owner
+        # Maps share their neighbor and mirror tables with their boards.
+        # ``mirror[index]`` is the same cell seen from the other side, and
+        # ``zone`` the rows each player may set up in.
+        self.neighbors = gamemap.neighbor_table(self.height, self.width) if neighbors is None else neighbors
+        self.mirror = gamemap.mirror_table(self.height, self.width) if mirror is None else mirror
+        self.zone = zone
+        self.turn = 0
+        self.unit_cells: Dict[Unit, int] = {}
+        self.player_units: Dict[int, Set[Unit]] = {1: set(), 2: set()}
+        self.unit_control = np.zeros((2, self.height, self.width), dtype=np.int32)
+        for cell in self.cells:
+            for unit in cell.units:
+                self.unit_cells[unit] = cell.index
+                self.player_units.setdefault(unit.player, set()).add(unit)
+                self.unit_control[unit.player - 1, cell.row, cell.column] += unit.control
+        # The control each player exerts on each cell, updated by delta as
+        # units move; ``Board.debug`` checks it against a full recompute.
+        self.influence = spread_control(self.unit_control)
+        # Hash of the units only; ``zobrist_hash`` adds the layout.
+        self.zobrist = 0
+        for cell in self.cells:
+            for player in (1, 2):
+                self.zobrist ^= zobrist_key("units", cell.index, player, sum(1 for unit in cell.units if unit.player == player))
+        self._layout_hash = None
+        self._layout_arrays = {}
+        self._reachable = {}
+        self._sight = {}
+        self._visibility = {}
+        # Last region found for each city, reused until a cell in it or on
+        # its border changes sides.
+        self._city_regions = {}
+
+    def reachable(self, movement: int) -> List[Tuple[int, ...]]:
+        """Per cell index, the indices a unit with the given movement can
+        legally move to, starting with the cell itself."""
+        cached = self._reachable.get(movement)
+        if cached is None or cached[0] != self._layout_version:
+            table = []
+            for cell in self.cells:
+                targets = [cell.index]
+                for row in range(max(0, cell.row - movement), min(self.height, cell.row + movement + 1)):
+                    span = movement - abs(row - cell.row)
+                    for column in range(max(0, cell.column - span), min(self.width, cell.column + span + 1)):
+                        target = self.cells[row * self.width + column]
+                        if target is not cell and target.type != Terrain.LAKE and target.type != Terrain.MOUNTAIN:
+                            targets.append(target.index)
+                table.append(tuple(targets))
+            cached = (self._layout_version, table)
+            self._reachable[movement] = cached
+        return cached[1]
+
+    def cell(self, row: int, column: int) -> Cell:
+        return self._own(row * self.width + column)
+
+    def city_mask(self, player: int | None = None) -> np.ndarray:
+        """Boolean ``(height, width)`` array of the cells holding a city, or
+        only the given player's cities."""
+        return self._layout_array(("city", player), lambda cell: cell.city == player if player else bool(cell.city))
+
+    def city_indices(self, player: int | None = None) -> Tuple[int, ...]:
+        """Flat indices of the cells holding a city, or only the given
+        player's cities."""
+        key = ("city indices", player)
+        cached = self._layout_arrays.get(key)
+        if cached is None or cached[0] != self._layout_version:
+            cached = (self._layout_version, tuple(np.flatnonzero(self.city_mask(player)).tolist()))
+            self._layout_arrays[key] = cached
+        return cached[1]
+
+    def terrain_mask(self, terrain: "Terrain") -> np.ndarray:
+        return self._layout_array(("terrain", terrain), lambda cell: cell.type == terrain)
+
+    def layout_codes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """``uint8`` arrays of every cell's terrain and city player (0 for none)."""
+        return (self._layout_array("terrain", lambda cell: cell.type, np.uint8),
+                self._layout_array("city", lambda cell: cell.city or 0, np.uint8))
+
+    def _layout_array(self, key, value, dtype=bool) -> np.ndarray:
+        cached = self._layout_arrays.get(key)
+        if cached is None or cached[0] != self._layout_version:
+            array = np.array([value(cell) for cell in self.cells], dtype=dtype).reshape(self.height, self.width)
+            array.flags.writeable = False
+            cached = (self._layout_version, array)
+            self._layout_arrays[key] = cached
+        return cached[1]
+
+    def sight(self, vision: int) -> List[Tuple[int, ...]]:
+        """Per cell index, the indices within ``vision`` steps of it."""
+        table = self._sight.get(vision)
+        if table is None:
+            table = []
+            for index in range(len(self.cells)):
+                seen = {index}
+                frontier = [index]
+                for _ in range(vision):
+                    frontier = [neighbor for current in frontier for neighbor in self.neighbors[current] if neighbor not in seen]
+                    seen.update(frontier)
+                table.append(tuple(sorted(seen)))
+            self._sight[vision] = table
+        return table
+
+    def adjacent(self, cell: Cell) -> Tuple[Cell, ...]:
+        return tuple(self._own(index) for index in self.neighbors[cell.index])
+
+    def contains(self, cell: Cell) -> bool:
+        return cell.index is not None and cell.index < len(self.cells) and self.cells[cell.index] is cell
+
+    def unit_cell(self, unit: Unit) -> Cell | None:
+        index = self.unit_cells.get(unit)
+        return None if index is None else self._own(index)
+
+    def unit_count(self, player: int) -> int:
+        return len(self.player_units.get(player, ()))
+
+    def place(self, unit: Unit, cell: Cell):
+        cell = self._writable_cell(cell.index)
+        count = sum(1 for other in cell.units if other.player == unit.player)
+        cell.units.append(unit)
+        self._visibility.pop(unit.player, None)
+        self.unit_cells[unit] = cell.index
+        self.player_units.setdefault(unit.player, set()).add(unit)
+        self._update_control(unit.player, cell.index, unit.control)
+        self._update_zobrist(unit.player, cell.index, count, count + 1)
+
+    def lift(self, unit: Unit) -> Cell:
+        if self._shared:
+            self._unshare()
+        cell = self._writable_cell(self.unit_cells.pop(unit))
+        cell.units.remove(unit)
+        self._visibility.pop(unit.player, None)
+        self.player_units[unit.player].discard(unit)
+        self._update_control(unit.player, cell.index, -unit.control)
+        count = sum(1 for other in cell.units if other.player == unit.player)
+        self._update_zobrist(unit.player, cell.index, count + 1, count)
+        return cell
+
+    def populate(self, counts: np.ndarray):
+        """Place new ``Unit``s on an empty board in one go, ``counts[player - 1,
+        row, column]`` of each player on each cell, without the unit cap."""
+        if self.unit_cells:
+            raise ValueError("Board already has units")
+        if self._shared:
+            self._unshare()
+        flat = counts.reshape(2, -1)
+        for player in (1, 2):
+            player_units = self.player_units.setdefault(player, set())
+            player_counts = flat[player - 1].tolist()
+            for index in np.flatnonzero(flat[player - 1]).tolist():
+                count = player_counts[index]
+                units = [Unit(player) for _ in range(count)]
+                self._writable_cell(index).units.extend(units)
+                for unit in units:
+                    self.unit_cells[unit] = index
+                player_units.update(units)
+                self.zobrist ^= zobrist_key("units", index, player, count)
+        self.unit_control = counts.reshape(2, self.height, self.width).astype(np.int32) * Unit.control
+        self.influence = spread_control(self.unit_control)
+        self._visibility = {}
+        if self.debug:
+            check_control_map(self)
+
+    def move_units(self, moves: List[Tuple[Unit, int]]):
+        """Move every unit to its target cell index in one bulk update.
+
+        The moves must already be legal; use ``apply_turn`` to validate them.
+        """
+        if self._shared:
+            self._unshare()
+        counts = {}
+        players = []
+        indices = []
+        deltas = []
+        for unit, target in moves:
+            source = self.unit_cells[unit]
+            if source == target:
+                continue
+            for index in (source, target):
+                if (index, unit.player) not in counts:
+                    counts[index, unit.player] = sum(1 for other in self.cells[index].units if other.player == unit.player)
+            self._writable_cell(source).units.remove(unit)
+            self._writable_cell(target).units.append(unit)
+            self.unit_cells[unit] = target
+            self._visibility.pop(unit.player, None)
+            players += [unit.player - 1, unit.player - 1]
+            indices += [source, target]
+            deltas += [-unit.control, unit.control]
+        if not indices:
+            return
+        np.add.at(self.unit_control.reshape(2, -1), (players, indices), deltas)
+        neighbors = self.neighbors
+        spread_players = []
+        spread_indices = []
+        spread_deltas = []
+        for player, index, delta in zip(players, indices, deltas):
+            around = neighbors[index]
+            spread_players += [player] * (len(around) + 1)
+            spread_indices.append(index)
+            spread_indices += around
+            spread_deltas += [delta] * (len(around) + 1)
+        np.add.at(self.influence.reshape(2, -1), (spread_players, spread_indices), spread_deltas)
+        for (index, player), old_count in counts.items():
+            new_count = sum(1 for other in self.cells[index].units if other.player == player)
+            self._update_zobrist(player, index, old_count, new_count)
+        if self.debug:
+            check_control_map(self)
+
+    def _update_zobrist(self, player: int, index: int, old_count: int, new_count: int):
+        self.zobrist ^= zobrist_key("units", index, player, old_count) ^ zobrist_key("units", index, player, new_count)
+
+    def zobrist_hash(self) -> int:
+        if self._layout_hash is None or self._layout_hash[0] != self._layout_version:
+            layout_hash = zobrist_key("shape", self.height, self.width)
+            for cell in self.cells:
+                layout_hash ^= zobrist_key("terrain", cell.index, int(cell.type)) ^ zobrist_key("city", cell.index, cell.city)
+            self._layout_hash = (self._layout_version, layout_hash)
+        return self.zobrist ^ self._layout_hash[1]
+
+    def snapshot(self) -> "Board":
+        """Return a structural-sharing copy of the board."""
+        other = Board.__new__(Board)
+        other.__dict__.update(self.__dict__)
+        # The copy owns none of the cells and copies each one it changes.
+        # This board keeps its own, and bumping the epoch makes it hand each
+        # of them over before its next in-place write.
+        other._owner = _Owner(other)
+        other._frozen = False
+        if self._frozen:
+            # Nothing is ever written to this board, so its cells need not
+            # be handed over.
+            other._family = weakref.WeakSet([other])
+        else:
+            self._family.add(other)
+            self._epoch += 1
+        self._shared = True
+        other._shared = True
+        return other
+
+    def freeze(self):
+        """Make the board read-only, for a template that is only snapshotted."""
+        # Writes to the board or its own cells raise ValueError; snapshots
+        # copy cells before changing them, so they are free to change.
+        self._frozen = True
+
+    def restore(self, snapshot: "Board"):
+        """Roll this board back to ``snapshot``, which stays usable."""
+        # Both boards now share cells, so they join one family and bump
+        # their epochs; this board keeps its owner marker.
+        family = self._family
+        if not snapshot._frozen and snapshot._family is not family:
+            for board in list(snapshot._family):
+                family.add(board)
+                board._family = family
+        owner, epoch = self._owner, self._epoch
+        self.__dict__.update(snapshot.__dict__)
+        self._owner = owner
+        self._epoch = epoch + 1
+        self._family = family
+        self._frozen = False
+        snapshot._epoch += 1
+        self._shared = True
+        snapshot._shared = True
+
+    def _unshare(self):
+        self.cells = list(self.cells)
+        self.unit_cells = dict(self.unit_cells)
+        self.player_units = {player: set(units) for player, units in self.player_units.items()}
+        self.unit_control = self.unit_control.copy()
+        self.influence = self.influence.copy()
+        self._visibility = dict(self._visibility)
+        self._shared = False
+
+    def _own(self, index: int) -> Cell:
+        cell = self.cells[index]
+        if cell.owner is not self._owner:
+            if self._shared:
+                self._unshare()
+            cell = cell.clone()
+            cell.owner = self._owner
+            cell.stamp = self._epoch
+            self.cells[index] = cell
+        return cell
+
+    def _writable_cell(self, index: int) -> Cell:
+        if self._frozen:
+            raise ValueError("Board is frozen")
+        if self._shared:
+            self._unshare()
+        cell = self._own(index)
+        if cell.stamp != self._epoch:
+            self._hand_over(cell)
+        return cell
+
+    def _hand_over(self, cell: Cell):
+        """Give every other board still holding ``cell`` a copy of it, so it
+        can be changed in place."""
+        # A cell's stamp is the epoch it was last handed over at, so this
+        # runs at most once per cell between snapshots.
+        index = cell.index
+        for board in self._family:
+            if board is not self and board.cells[index] is cell:
+                copy = cell.clone()
+                copy.owner = None
+                board.cells[index] = copy
+        cell.stamp = self._epoch
+
+    def _layout_write(self, cell: Cell):
+        if self._frozen:
+            raise ValueError("Board is frozen")
+        if self._shared:
+            self._unshare()
+        if cell.stamp != self._epoch:
+            self._hand_over(cell)
+        self._layout_version = _next_layout_version()
+
+    def _update_control(self, player: int, index: int, delta: int):
+        unit_control = self.unit_control.reshape(2, -1)
+        influence = self.influence.reshape(2, -1)
+        unit_control[player - 1, index] += delta
+        influence[player - 1, index] += delta
+        for neighbor in self.neighbors[index]:
+            influence[player - 1, neighbor] += delta
+        if self.debug:
+            check_control_map(self)
+
+    def __getitem__(self, row: int) -> List[Cell]:
+        if row < 0:
+            row += self.height
+        if row < 0 or row >= self.height:
+            raise IndexError("board row out of range")
+        return self._row(row)
+
+    def __iter__(self):
+        for row in range(self.height):
+            yield self._row(row)
+
+    def _row(self, row: int) -> List[Cell]:
+        start = row * self.width
+        return [self._own(index) for index in range(start, start + self.width)]
+
+    def __len__(self):
+        return self.height
+
+@cache
+def zobrist_key(*parts) -> int:
+    """Stable 64-bit random key for a (kind, cell index, value...) feature.
+
+    Keys are derived from the feature itself rather than from a random
+    stream, so every process hashes the same position to the same value.
+    An empty feature (no units, plain terrain, no city) hashes to 0. Pass
+    terrain as a plain int so the key does not depend on the enum's repr.
+    """
+    if parts[-1] in (0, None):
+        return 0
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+class TranspositionCache():
+    """Bounded LRU map from position keys to results, with hit counters."""
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+_MISSING = object()
+
+def get_cell_position(board: Board, cell: Cell):
+    if not board.contains(cell):
+        raise ValueError("Cell not found on board")
+    return cell.row, cell.column
+
+def get_adjacent_cells(board: Board, cell: Cell) -> Set[Cell]:
+    if not board.contains(cell):
+        raise ValueError("Cell not found on board")
+    return set(board.adjacent(cell))
+
+def spread_control(unit_control: np.ndarray) -> np.ndarray:
+    """Add to every cell the values of its orthogonal neighbors.
+
+    Works on any array whose last two axes are rows and columns; cells on the
+    edges simply have fewer neighbors.
+    """
+    spread = unit_control.copy()
+    spread[..., 1:, :] += unit_control[..., :-1, :]
+    spread[..., :-1, :] += unit_control[..., 1:, :]
+    spread[..., :, 1:] += unit_control[..., :, :-1]
+    spread[..., :, :-1] += unit_control[..., :, 1:]
+    return spread
+
+def compute_control_map(board: Board) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the signed control grid and the "no influence" mask of the board.
+
+    The control grid holds player 1 control minus player 2 control for every
+    cell. The mask is True where ``get_cell_control`` returns None: no unit of
+    either player in or next to the cell, and no city on it. Lakes and
+    mountains need no special casing since no unit can stand on them.
+    """
+    influence = board.influence
+    control = influence[0] - influence[1]
+    no_influence = (influence[0] == 0) & (influence[1] == 0) & ~board.city_mask()
+    return control, no_influence
+
+def check_control_map(board: Board):
+    """Raise AssertionError if the board's incrementally maintained influence
+    differs from a full recompute."""
+    expected = spread_control(board.unit_control)
+    if not np.array_equal(board.influence, expected):
+        mismatches = np.argwhere(board.influence != expected)
+        raise AssertionError(f"Control map out of sync at (player, row, column) {mismatches.tolist()}")
+
+def get_cells_adjacent_to_set(board: Board, cells: Set[Cell]) -> Set[Cell]:
     adjacent_cells = set()
     for cell in cells:
         adjacent_cells.update(get_adjacent_cells(board, cell))
     return adjacent_cells - cells 
 
-def get_cell_control(board: List[List[Cell]], cell: Cell) -> tuple[int, int]:
-    player_1_control = 0
-    player_2_control = 0
-    cells_to_check = [cell]
-    adjacent_cells = get_adjacent_cells(board, cell)
-    cells_to_check.extend(adjacent_cells)
-    for current_cell in cells_to_check:
-        for unit in current_cell.units:
-            if unit.player == 1:
-                player_1_control += unit.control
-            else:
-                player_2_control += unit.control
+def get_cell_control(board: Board, cell: Cell) -> tuple[int, int]:
+    influence = board.influence
+    player_1_control = int(influence[0, cell.row, cell.column])
+    player_2_control = int(influence[1, cell.row, cell.column])
     if player_1_control == 0 and player_2_control == 0 and not cell.city:
         return None
     else:
         return player_1_control - player_2_control
 
-def get_cell_visibility(board: List[List[Cell]], cell: Cell, player: int):
-    if cell.city == player:
-        return True
-    for unit in cell.units:
-        if unit.player == player:
-            return True
-    if cell.type != "forest":
-        adjacent_cells = get_adjacent_cells(board, cell)
-        for adjacent_cell in adjacent_cells:
-            for unit in adjacent_cell.units:
-                if unit.player == player:
-                    return True
-    return False
-
-def get_player_units(board: List[List[Cell]], player) -> List[Unit]:
-    units = []
-    for row in board:
-        for cell in row:
-            for unit in cell.units:
-                if unit.player == player:
-                    units.append(unit)
-    return units
-
-def get_unit_position(board: List[List[Cell]], unit):
-    for row_index, row in enumerate(board):
-        for column, cell in enumerate(row):
-            if unit in cell.units:
-                return row_index, column
-    return None
+def compute_visibility_map(board: Board, player: int) -> np.ndarray:
+    """Return the read-only ``(height, width)`` mask of the cells the player can see.
+
+    A player sees their own cities, the cells holding their units and every
+    cell within ``Unit.vision`` steps of one of their units, except forests,
+    which hide what is in them from units outside. The mask is cached on the
+    board until one of the player's units is placed or lifted, or the
+    board's terrain or cities change.
+    """
+    cached = board._visibility.get(player)
+    if cached is not None and cached[0] == board._layout_version:
+        return cached[1]
+    seen = np.zeros(len(board.cells), dtype=bool)
+    occupied = np.zeros(len(board.cells), dtype=bool)
+    for unit in board.player_units.get(player, ()):
+        index = board.unit_cells[unit]
+        occupied[index] = True
+        seen[list(board.sight(unit.vision)[index])] = True
+    shape = (board.height, board.width)
+    visible = occupied.reshape(shape) | board.city_mask(player) | (seen.reshape(shape) & ~board.terrain_mask(Terrain.FOREST))
+    visible.flags.writeable = False
+    board._visibility[player] = (board._layout_version, visible)
+    return visible
+
+def get_cell_visibility(board: Board, cell: Cell, player: int):
+    return bool(compute_visibility_map(board, player)[cell.row, cell.column])
+
+def get_player_units(board: Board, player) -> List[Unit]:
+    units = board.player_units.get(player, ())
+    # Keep the order of a row-major scan of the board.
+    return sorted(units, key=lambda unit: (board.unit_cells[unit], board.cells[board.unit_cells[unit]].units.index(unit)))
+
+def get_unit_position(board: Board, unit):
+    cell = board.unit_cell(unit)
+    if cell is None:
+        return None
+    return cell.row, cell.column
             
-def get_unit_cell(board: List[List[Cell]], unit: Unit):
-    for row in board:
-        for cell in row:
-            if unit in cell.units:
-                return cell
-    return None
+def get_unit_cell(board: Board, unit: Unit):
+    return board.unit_cell(unit)
 
-def add_unit(board: List[List[Cell]], unit: Unit, cell: Cell):
-    if cell.type == "lake" or cell.type == "mountain":
+def add_unit(board: Board, unit: Unit, cell: Cell):
+    if cell.type == Terrain.LAKE or cell.type == Terrain.MOUNTAIN:
         print("Invalid coordinates, unit cannot be placed on lake.")
         raise ValueError("Player already has 7 units on the board")
-    player = unit.player
-    player_units = get_player_units(board, player)
-    if len(player_units) == 7:
+    if board.unit_count(unit.player) >= MAX_PLAYER_UNITS:
         raise ValueError("Player already has 7 units on the board")
-    cell.units.append(unit)
+    board.place(unit, cell)
 
-def validate_unit_move(board: List[List[Cell]], unit: Unit, target_cell: Cell):
-    starting_cell = get_unit_cell(board, unit)
-    if not starting_cell:
-        print("Unit not found on board")
-        return False
-    if target_cell.type == "lake" or target_cell.type == "mountain":
-        print("Invalid coordinates, unit cannot be placed on lake.")
-        return False
-    starting_row, starting_column = get_cell_position(board, starting_cell)
+def get_move_error(board: Board, unit: Unit, target_cell: Cell) -> str | None:
+    """Return why moving the unit to the target cell is illegal, or None."""
+    starting_index = board.unit_cells.get(unit)
+    if starting_index is None:
+        return "Unit not found on board"
+    if target_cell.type == Terrain.LAKE or target_cell.type == Terrain.MOUNTAIN:
+        return "Invalid coordinates, unit cannot be placed on lake."
+    starting_row, starting_column = divmod(starting_index, board.width)
     end_row, end_column = get_cell_position(board, target_cell)
     if abs(starting_row - end_row) +  abs(starting_column - end_column) > unit.movement:
-        print("Unit cannot move that far")
+        return "Unit cannot move that far"
+    return None
+
+def validate_unit_move(board: Board, unit: Unit, target_cell: Cell):
+    error = get_move_error(board, unit, target_cell)
+    if error:
+        print(error)
         return False
     return True
 
+def generate_legal_moves(board: Board, player: int) -> Tuple[List[Unit], np.ndarray]:
+    """Return the player's units and every legal move for them.
+
+    Moves are rows of ``(unit slot, target cell index)`` in an ``(n, 2)``
+    integer array, where the slot indexes the returned unit list (ordered
+    like ``get_player_units``). Staying put is always included, first for
+    each unit.
+    """
+    units = get_player_units(board, player)
+    moves = []
+    for slot, unit in enumerate(units):
+        for target in board.reachable(unit.movement)[board.unit_cells[unit]]:
+            moves.append((slot, target))
+    return units, np.array(moves, dtype=np.int32).reshape(-1, 2)
+
+def generate_joint_moves(board: Board, player: int) -> Tuple[List[Unit], Iterator[Tuple[int, ...]]]:
+    """Return the player's units and an iterator over whole-turn move sets.
+
+    Each move set is a tuple with the target cell index of every unit, in the
+    order of the returned unit list. Units of the same kind sharing a cell
+    are interchangeable, so for each such group only one ordering of the
+    targets is produced.
+    """
+    units = get_player_units(board, player)
+    groups = []
+    for unit in units:
+        key = (board.unit_cells[unit], type(unit))
+        if groups and groups[-1][0] == key:
+            groups[-1][1].append(unit)
+        else:
+            groups.append([key, [unit]])
+    choices = [list(itertools.combinations_with_replacement(board.reachable(members[0].movement)[index], len(members)))
+               for (index, _), members in groups]
+    joint_moves = (tuple(itertools.chain.from_iterable(parts)) for parts in itertools.product(*choices))
+    return units, joint_moves
+
+def expand_joint_move(board: Board, units: List[Unit], joint_move: Tuple[int, ...]) -> List[Tuple[Unit, Cell]]:
+    return [(unit, board.cells[target]) for unit, target in zip(units, joint_move)]
+
+class InvalidTurnError(ValueError):
+    """A turn's move set had illegal moves. ``errors`` holds a ``(player,
+    move number, reason)`` tuple for each of them."""
+    def __init__(self, errors: List[Tuple[int, int, str]]):
+        self.errors = errors
+        super().__init__("; ".join(f"player {player} move {number}: {reason}" for player, number, reason in errors))
 
-def move_unit(board: List[List[Cell]], unit: Unit, target_cell: Cell):
+def apply_turn(board: Board, player_1_moves: List[Tuple[Unit, Cell]], player_2_moves: List[Tuple[Unit, Cell]]):
+    """Apply both players' moves for a turn as one transaction.
+
+    Every move is checked against the board as it was before the turn. If
+    any is illegal, InvalidTurnError is raised listing all of them and the
+    board is left untouched; otherwise all units move in one bulk update.
+    """
+    errors = []
+    targets = []
+    moved = set()
+    for player, player_moves in ((1, player_1_moves), (2, player_2_moves)):
+        for number, (unit, target_cell) in enumerate(player_moves):
+            if unit.player != player:
+                reason = f"Unit belongs to player {unit.player}"
+            elif unit in moved:
+                reason = "Unit is moved more than once"
+            else:
+                reason = get_move_error(board, unit, target_cell)
+            moved.add(unit)
+            if reason:
+                errors.append((player, number, reason))
+            else:
+                targets.append((unit, target_cell.index))
+    if errors:
+        raise InvalidTurnError(errors)
+    board.move_units(targets)
+
+def move_unit(board: Board, unit: Unit, target_cell: Cell):
     if validate_unit_move(board, unit, target_cell):
-        starting_cell = get_unit_cell(board, unit)
-        starting_cell.units.remove(unit)
+        starting_cell = board.lift(unit)
         try:
             add_unit(board, unit, target_cell)
         except Exception as e:
-            add_unit(board, unit, starting_cell)
+            board.place(unit, starting_cell)
             raise e
     else:
         raise ValueError("Invalid move")
 
-def remove_unit(board: List[List[Cell]], unit: Unit):
-    cell = get_unit_cell(board, unit)
-    cell.units.remove(unit)
+def remove_unit(board: Board, unit: Unit):
+    board.lift(unit)
 
 def check_player_control(control_value: int, player: int) -> bool:
     if control_value is None:
         return False
     return control_value > 0 if player == 1 else control_value < 0
 
-def check_player_controls_cell(board: List[List[Cell]], cell: Cell, player: int) -> bool:
+def check_player_controls_cell(board: Board, cell: Cell, player: int) -> bool:
     control_value = get_cell_control(board, cell)
     return check_player_control(control_value, player)
 
-def get_contiguous_controlled_or_contested_cells(board: List[List[int]], cell: Cell, player: int) -> Set[Cell]:
-    def controlled_or_contested(cell, player):
-        control_value = get_cell_control(board, cell)
-        return control_value == 0 or check_player_control(control_value, player)
-    
-    if controlled_or_contested(cell, player):
-        contiguous_cells = {cell}
-        while True:
-            new_cells = get_cells_adjacent_to_set(board, contiguous_cells)
-            new_controlled_or_contested_cells = {new_cell for new_cell in new_cells if controlled_or_contested(new_cell, player)}
-            if not new_controlled_or_contested_cells:
-                break
-            contiguous_cells.update(new_controlled_or_contested_cells)
-            
-        return contiguous_cells
-    else:
-        return set()
+class Regions():
+    """The controlled-or-contested regions of one player.
+
+    A cell is controlled-or-contested for a player when its control value is
+    0 or in the player's favour. ``labels[index]`` is the region number of the
+    cell at ``index``, or -1 when the cell belongs to no region. ``free[label]``
+    tells whether the region borders a cell nobody has influence over, which
+    is what keeps the units in it alive.
+    """
+    def __init__(self, board: Board, player: int, labels: List[int], free: List[bool]):
+        self.board = board
+        self.player = player
+        self.labels = labels
+        self.free = free
+
+    def region_cells(self, cell: Cell) -> Set[Cell]:
+        label = self.labels[cell.index]
+        if label == -1:
+            return set()
+        cells = self.board.cells
+        return {cells[index] for index, other in enumerate(self.labels) if other == label}
+
+    def is_free(self, cell: Cell) -> bool:
+        label = self.labels[cell.index]
+        return label != -1 and self.free[label]
+
+def _region_arrays(board: Board, player: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return flat boolean arrays telling whether each cell is
+    controlled-or-contested for the player and whether nobody has influence
+    over it."""
+    control, no_influence = compute_control_map(board)
+    if player == 2:
+        control = -control
+    member = (control >= 0) & ~no_influence
+    return member.ravel(), no_influence.ravel()
+
+def _region_masks(board: Board, player: int) -> Tuple[List[bool], List[bool]]:
+    """``_region_arrays`` as lists, which are faster to index one by one."""
+    member, no_influence = _region_arrays(board, player)
+    return member.tolist(), no_influence.tolist()
+
+def _flood_region(board: Board, start: int, member: List[bool], no_influence: List[bool], labels, label: int) -> bool:
+    """Label the region containing ``start`` and return whether it has a liberty."""
+    neighbors = board.neighbors
+    has_liberty = False
+    labels[start] = label
+    stack = [start]
+    while stack:
+        index = stack.pop()
+        for neighbor in neighbors[index]:
+            if member[neighbor]:
+                if labels[neighbor] == -1:
+                    labels[neighbor] = label
+                    stack.append(neighbor)
+            elif no_influence[neighbor]:
+                has_liberty = True
+    return has_liberty
+
+def label_regions(board: Board, player: int) -> Regions:
+    """Split the board into the player's controlled-or-contested regions in
+    a single pass and flag which of them have a liberty."""
+    member, no_influence = _region_masks(board, player)
+    labels = [-1] * len(member)
+    free = []
+    for start, is_member in enumerate(member):
+        if is_member and labels[start] == -1:
+            free.append(_flood_region(board, start, member, no_influence, labels, len(free)))
+    return Regions(board, player, labels, free)
+
+def get_contiguous_controlled_or_contested_cells(board: Board, cell: Cell, player: int) -> Set[Cell]:
+    return label_regions(board, player).region_cells(cell)
 
 def get_opposing_player(player: int) -> int:
     return 1 if player == 2 else 2
 
-def check_for_freedom(board: List[List[Cell]], cell: Cell, player: int) -> bool:
-    opponent = get_opposing_player(player)
-    if check_player_controls_cell(board, cell, opponent):
-        return False
-    contiguous_cells = get_contiguous_controlled_or_contested_cells(board, cell, player)
-    adjacent_cells = get_cells_adjacent_to_set(board, contiguous_cells)
-    if all(check_player_controls_cell(board, adjacent_cell, opponent) for adjacent_cell in adjacent_cells):
+def check_for_freedom(board: Board, cell: Cell, player: int, regions: Regions | None = None) -> bool:
+    if regions is None:
+        regions = label_regions(board, player)
+    return regions.is_free(cell)
+
+def _city_region(board: Board, index: int, player: int, member: np.ndarray, no_influence: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the flat indices of the player's region holding the city at
+    ``index``, which must be controlled-or-contested for them, and of the
+    cells bordering it.
+
+    The last region found for the city is reused as long as all its cells
+    are still members and none of its border cells has become one, since
+    nothing else can change which cells are connected to the city.
+    """
+    cached = board._city_regions.get(index)
+    if cached is not None and cached[0] == board._layout_version and cached[1] == player:
+        region, boundary = cached[2], cached[3]
+        if member[region].all() and not member[boundary].any():
+            return region, boundary
+    # Members are flagged 1 and border cells 2 as they are reached.
+    seen = bytearray(member.view(np.uint8).tobytes())
+    neighbors = board.neighbors
+    inside = [index]
+    border = []
+    seen[index] = 3
+    for cell in inside:
+        for neighbor in neighbors[cell]:
+            flag = seen[neighbor]
+            if flag == 1:
+                seen[neighbor] = 3
+                inside.append(neighbor)
+            elif flag == 0:
+                seen[neighbor] = 2
+                border.append(neighbor)
+    region = np.array(inside, dtype=np.intp)
+    boundary = np.array(border, dtype=np.intp)
+    board._city_regions[index] = (board._layout_version, player, region, boundary)
+    return region, boundary
+
+def _city_has_freedom(board: Board, index: int, player: int, member: np.ndarray, no_influence: np.ndarray) -> bool:
+    if not member[index]:
         return False
-    return True
+    boundary = _city_region(board, index, player, member, no_influence)[1]
+    return bool(no_influence[boundary].any())
+
+class ResolutionStats():
+    """How much work a call to ``resolve_units`` did.
+
+    ``rounds`` counts the passes over the board including the final one that
+    removed nothing, ``evaluations`` counts the (cell, player) freedom checks
+    and ``removed`` the units taken off the board. ``cached`` is True when the
+    result came from a transposition cache.
+    """
+    def __init__(self):
+        self.rounds = 0
+        self.evaluations = 0
+        self.removed = 0
+        self.cached = False
 
-def resolve_units(board: List[List[Cell]]) -> int | None:
+    def __repr__(self):
+        return f"ResolutionStats(rounds={self.rounds}, evaluations={self.evaluations}, removed={self.removed}, cached={self.cached})"
+
+def resolve_units(board: Board, transpositions: TranspositionCache | None = None) -> ResolutionStats:
+    """Remove every unit without freedom until the board is stable.
+
+    The first round checks every occupied cell. Removing units only changes
+    control on their cells and the neighbors of those cells, so later rounds
+    only re-check units in the regions that contain or border such a cell;
+    every other region keeps both its shape and its liberties.
+
+    With a ``transpositions`` cache, the cells cleared for a position are
+    remembered under its Zobrist hash and replayed the next time the same
+    position resolves.
+    """
+    stats = ResolutionStats()
+    if transpositions is not None:
+        key = ("resolve", board.zobrist_hash())
+        cleared = transpositions.get(key, _MISSING)
+        if cleared is not _MISSING:
+            stats.cached = True
+            for index, player in cleared:
+                for unit in [unit for unit in board.cells[index].units if unit.player == player]:
+                    remove_unit(board, unit)
+                    stats.removed += 1
+            return stats
+    cleared = []
+    dead = {}
+    for player in (1, 2):
+        regions = label_regions(board, player)
+        occupied = {board.unit_cells[unit] for unit in board.player_units.get(player, ())}
+        stats.evaluations += len(occupied)
+        dead[player] = [index for index in occupied if not regions.is_free(board.cells[index])]
     while True:
+        stats.rounds += 1
         units_to_be_removed = []
-        for row in board:
-            for cell in row:
-                if cell.units:
-                    player_1_units = [unit for unit in cell.units if unit.player == 1]
-                    if len(player_1_units) > 0:
-                        if not check_for_freedom(board, cell, 1):
-                            for unit in player_1_units:
-                                units_to_be_removed.append(unit)
-                    player_2_units = [unit for unit in cell.units if unit.player == 2]
-                    if len(player_2_units) > 0:
-                        if not check_for_freedom(board, cell, 2):
-                            for unit in player_2_units:
-                                units_to_be_removed.append(unit)
-
+        for player in (1, 2):
+            for index in dead[player]:
+                cleared.append((index, player))
+                units_to_be_removed.extend(unit for unit in board.cells[index].units if unit.player == player)
         if len(units_to_be_removed) == 0:
+            if transpositions is not None:
+                transpositions.put(key, cleared)
             break
+        touched = set()
+        for unit in units_to_be_removed:
+            index = board.unit_cells[unit]
+            touched.add(index)
+            touched.update(board.neighbors[index])
         for unit in units_to_be_removed:
             remove_unit(board, unit)
-    
-def check_for_winner(board: List[List[Cell]]) -> int | None:
+        stats.removed += len(units_to_be_removed)
+        seeds = set(touched)
+        for index in touched:
+            seeds.update(board.neighbors[index])
+        for player in (1, 2):
+            dead[player] = _recheck_regions(board, player, seeds, stats)
+    return stats
+
+def _recheck_regions(board: Board, player: int, seeds: Set[int], stats: ResolutionStats) -> List[int]:
+    """Return the indices of cells whose units of the player lost their
+    freedom, looking only at the regions reached from ``seeds``."""
+    member, no_influence = _region_masks(board, player)
+    labels = {}
+    dead = []
+    checked = set()
+    for seed in seeds:
+        if seed in checked:
+            continue
+        if not member[seed]:
+            checked.add(seed)
+            if any(unit.player == player for unit in board.cells[seed].units):
+                stats.evaluations += 1
+                dead.append(seed)
+            continue
+        region = _LabelMap(labels)
+        free = _flood_region(board, seed, member, no_influence, region, 0)
+        for index in region.added:
+            checked.add(index)
+            if any(unit.player == player for unit in board.cells[index].units):
+                stats.evaluations += 1
+                if not free:
+                    dead.append(index)
+    return dead
+
+class _LabelMap():
+    """Sparse stand-in for the label list used by ``_flood_region``."""
+    def __init__(self, labels: Dict[int, int]):
+        self.labels = labels
+        self.added = []
+
+    def __getitem__(self, index: int) -> int:
+        return self.labels.get(index, -1)
+
+    def __setitem__(self, index: int, label: int):
+        self.labels[index] = label
+        self.added.append(index)
+
+def check_for_winner(board: Board, transpositions: TranspositionCache | None = None) -> int | None:
+    if transpositions is not None:
+        key = ("winner", board.zobrist_hash())
+        winner = transpositions.get(key, _MISSING)
+        if winner is _MISSING:
+            winner = check_for_winner(board)
+            transpositions.put(key, winner)
+        return winner
     winners = []
-    for row in board:
-        for cell in row:
-            if cell.city:
-                if not check_for_freedom(board, cell, cell.city):
-                    winners.append(get_opposing_player(cell.city))
+    for player in (1, 2):
+        cities = board.city_indices(player)
+        if not cities:
+            continue
+        member, no_influence = _region_arrays(board, player)
+        for index in cities:
+            if not _city_has_freedom(board, index, player, member, no_influence):
+                winners.append(get_opposing_player(player))
     if len(winners) == 1:
         return winners[0]
     elif len(winners) == 2:
         return 3
     return None
 
+def city_threats(board: Board, player: int) -> List[Tuple[Cell, List[Tuple[Unit, Cell]]]]:
+    """Return the opponent move sets that would cut off one of the player's
+    cities this turn, as ``(city cell, moves)`` pairs.
+
+    A city falls when its region loses its last liberty or when the opponent
+    takes control of a cell in it, starting with the city's own cell. The
+    candidates are the smallest sets of opponent moves bringing a unit onto
+    or next to every liberty, then, for each cell of the region, the smallest
+    sets bringing enough units onto or next to it to take control of it.
+    Each candidate is played on a snapshot with every other unit staying
+    put, and kept if the city has no freedom once the turn is resolved.
+    Candidates containing a move set already kept are skipped, and cities
+    without freedom already are left out.
+    """
+    opponent = get_opposing_player(player)
+    member, no_influence = _region_arrays(board, player)
+    influence = board.influence.reshape(2, -1)
+    pools = {}
+    for unit in get_player_units(board, opponent):
+        pools.setdefault((board.unit_cells[unit], unit.movement), []).append(unit)
+    available = {pool: len(units) for pool, units in pools.items()}
+    threats = []
+    for index in board.city_indices(player):
+        if not member[index]:
+            continue
+        region, boundary = _city_region(board, index, player, member, no_influence)
+        liberties = [cell for cell in boundary.tolist() if no_influence[cell]]
+        if not liberties:
+            continue
+        options = []
+        for pool in pools:
+            source, movement = pool
+            for target in board.reachable(movement)[source]:
+                covered = frozenset(liberty for liberty in liberties if liberty == target or liberty in board.neighbors[target])
+                if covered and target != source:
+                    options.append((pool, target, covered))
+        covers = set()
+        _cover_liberties(liberties, options, dict(available), (), covers)
+        minimal = [cover for cover in covers if not any(other < cover for other in covers)]
+        candidates = [tuple(sorted(options[option][:2] for option in cover))
+                      for cover in sorted(minimal, key=lambda cover: (len(cover), sorted(cover)))]
+        # The region lists the city first.
+        for cell in region.tolist():
+            candidates += _flip_candidates(board, cell, pools, available,
+                                           int(influence[player - 1, cell] - influence[opponent - 1, cell]) + 1)
+        kept = []
+        for candidate in candidates:
+            counts = Counter(candidate)
+            if any(not found - counts for found in kept):
+                continue
+            moves = []
+            taken = {}
+            for pool, target in candidate:
+                moves.append((pools[pool][taken.get(pool, 0)], board.cells[target]))
+                taken[pool] = taken.get(pool, 0) + 1
+            trial = board.snapshot()
+            apply_turn(trial, *((moves, []) if opponent == 1 else ([], moves)))
+            resolve_units(trial)
+            if not check_for_freedom(trial, trial.cells[index], player):
+                kept.append(counts)
+                threats.append((board.cells[index], moves))
+    return threats
+
+def _cover_liberties(liberties: List[int], options: List[Tuple[Tuple[int, int], int, frozenset]],
+                     available: Dict[Tuple[int, int], int], chosen: Tuple[int, ...], covers: Set[frozenset]):
+    """Collect into ``covers`` the sets of option numbers that reach every
+    liberty, using at most ``available[pool]`` of the units in each pool of
+    units with the same cell and movement."""
+    covered = set()
+    for option in chosen:
+        covered |= options[option][2]
+    uncovered = next((liberty for liberty in liberties if liberty not in covered), None)
+    if uncovered is None:
+        covers.add(frozenset(chosen))
+        return
+    for option, (pool, _, reached) in enumerate(options):
+        if uncovered in reached and available[pool] and option not in chosen:
+            available[pool] -= 1
+            _cover_liberties(liberties, options, available, chosen + (option,), covers)
+            available[pool] += 1
+
+def _flip_candidates(board: Board, cell: int, pools: Dict[Tuple[int, int], List[Unit]],
+                     available: Dict[Tuple[int, int], int], needed: int) -> List[Tuple[Tuple[Tuple[int, int], int], ...]]:
+    """Return the sets of ``needed`` ``(pool, target)`` moves that each bring
+    a unit onto or next to ``cell`` from outside its reach, which raises the
+    moving player's control of the cell by ``needed``."""
+    around = {cell, *board.neighbors[cell]}
+    options = [(pool, target) for pool in pools if pool[0] not in around
+               for target in board.reachable(pool[1])[pool[0]] if target in around]
+    if sum(available[pool] for pool in {pool for pool, _ in options}) < needed:
+        return []
+    candidates = []
+    for candidate in itertools.combinations_with_replacement(options, needed):
+        counts = Counter(pool for pool, _ in candidate)
+        if all(count <= available[pool] for pool, count in counts.items()):
+            candidates.append(candidate)
+    return candidates
+
+class CellView():
+    """One cell of a PlayerView, with players, cities and control expressed
+    from the viewing player's side."""
+    __slots__ = ("cell", "view", "visible")
+
+    def __init__(self, view: "PlayerView", cell: Cell, visible: bool):
+        self.view = view
+        self.cell = cell
+        self.visible = visible
+
+    @property
+    def type(self) -> Terrain:
+        return self.cell.type
+
+    @property
+    def city(self) -> int | None:
+        return self.view.relabel(self.cell.city) if self.cell.city else self.cell.city
+
+    @property
+    def players(self) -> List[int]:
+        return [self.view.relabel(unit.player) for unit in self.cell.units]
+
+    @property
+    def control(self) -> int | None:
+        control_value = get_cell_control(self.view.board, self.cell)
+        if control_value is not None and self.view.player == 2:
+            control_value = -control_value
+        return control_value
+
+class PlayerView():
+    """Read-only projection of a live board as one player sees it.
+
+    Cells outside the player's sight are marked invisible. Player 2's view is
+    rotated half a turn with the player numbers swapped, so each player sees
+    their own side at the bottom as player 1. With no player the whole board
+    is shown as is. Nothing is copied; cells are read from the board on access.
+    """
+    def __init__(self, board: Board, player: int | None = None):
+        self.board = board
+        self.player = player
+        self.height = board.height
+        self.width = board.width
+        if player is None:
+            self.visibility = None
+        else:
+            self.visibility = compute_visibility_map(board, player).ravel().tolist()
+
+    def relabel(self, player: int) -> int:
+        return get_opposing_player(player) if self.player == 2 else player
+
+    def board_index(self, row: int, column: int) -> int:
+        index = row * self.width + column
+        return self.board.mirror[index] if self.player == 2 else index
+
+    def cell(self, row: int, column: int) -> CellView:
+        index = self.board_index(row, column)
+        visible = True if self.visibility is None else self.visibility[index]
+        return CellView(self, self.board.cells[index], visible)
+
+    def __iter__(self):
+        for row in range(self.height):
+            yield [self.cell(row, column) for column in range(self.width)]
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J\x1b[3J"
+
 def clear_console():
-    os.system('cls' if os.name=='nt' else 'clear')
-
-def print_board(board: List[List[Cell]]):
-    cell_width = 9
-    # Define the horizontal separator
-    horizontal_separator = ("+"+("-"*cell_width)) * len(board[0]) + "+"
-
-    # Print the top border
-    print(horizontal_separator)
-
-    # Print each row
-    for index,row in enumerate(board):
-        line = "|"
-        for cell in row:
-            if cell.visible:
-                if len(cell.units) > 6:
-                    number_of_player_1_units = len([unit for unit in cell.units if unit.player == 1])
-                    if number_of_player_1_units > 0:
-                        line += f"1x{number_of_player_1_units}"
-                    else:
-                        line += "   "
-                elif len(cell.units) > 0:
-                    unit = cell.units[0]
-                    if unit in cell.units:
-                        line += f"({unit.player})"
-                else:
-                    line += "   "
-                if cell.type == "mountain" or cell.type == "lake":
-                    line += f"   "
-                else:
-                    control_value = get_cell_control(board, cell)
-                    if control_value is None:
-                        line += " N "
-                    else:
-                        if control_value < 0:
-                            line += f"{control_value} "
-                        else:
-                            line += f" {control_value} "
-                if len(cell.units) > 6:
-                    number_of_player_2_units = len([unit for unit in cell.units if unit.player == 2])
-                    if number_of_player_2_units > 0:
-                        line += f"2x{number_of_player_2_units}"
-                    else:
-                        line += "   "
-                elif len(cell.units) > 1:
-                    unit = cell.units[1]
-                    if unit in cell.units:
-                        line += f"({unit.player})"
-                else:
-                    line += ("   ")
-                line += "|"
-            else:
-                line += " " * cell_width + "|"
-        print(line)
-        line = "|"
-        for cell in row:
-            new_line = ""
-            if cell.visible and len(cell.units) > 2 and len(cell.units) < 7:
-                unit = cell.units[2]
-                if unit in cell.units:
-                    new_line += f"({unit.player})"
+    """Clear the screen and its scrollback, and make the next
+    ``draw_player_view`` redraw the whole board."""
+    _enable_ansi()
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
+    _renderer.reset()
+
+_ansi_enabled = False
+
+def _enable_ansi():
+    global _ansi_enabled
+    if not _ansi_enabled and os.name == "nt":
+        # Running any command switches the Windows console to processing
+        # ANSI escape sequences.
+        os.system("")
+    _ansi_enabled = True
+
+def render_cells(view: PlayerView) -> List[List[Tuple[str, str, str]]]:
+    """Return the three text lines of every cell of the view, row by row,
+    without the borders."""
+    height, width = view.height, view.width
+    label_width = max(3, len(f"{height - 1},{width - 1}"))
+    cell_width = 6 + label_width
+    padding = " " * (cell_width - 9)
+    hidden = " " * cell_width
+    control, no_influence = compute_control_map(view.board)
+    if view.player == 2:
+        control = -control
+    control = control.ravel().tolist()
+    no_influence = no_influence.ravel().tolist()
+    rows = []
+    for row in range(height):
+        cells = []
+        for column in range(width):
+            cell = view.cell(row, column)
+            visible = cell.visible
+            players = cell.players if visible else ()
+            count = len(players)
+            cell_type = cell.type
+            if not visible:
+                top = hidden
             else:
-                new_line = " " * 3
-            # Check if the current cell is the middle cell for the "mountain"
-            if cell.type == "mountain":
-                cell_content = "^^^"
-            elif cell.type == "forest":
-                cell_content = ") ("
-            elif cell.type == "lake":
-                cell_content = "~~~"
-            elif cell.type == "plain":
-                if cell.visible and cell.city:
-                    cell_content = f"[{cell.city}]"
+                if count > 6:
+                    number_of_player_1_units = players.count(1)
+                    top = f"1x{number_of_player_1_units}" if number_of_player_1_units > 0 else "   "
+                elif count > 0:
+                    top = f"({players[0]})"
                 else:
-                    cell_content = " " * 3
-            
-            if cell.visible and len(cell.units) > 3 and len(cell.units) < 7:
-                unit = cell.units[3]
-                if unit in cell.units:
-                    cell_content += f"({unit.player})"
-            else:
-                cell_content += " " * 3
-
-            new_line += cell_content + "|"
-            line += new_line
-        print(line)
-        line = "|"
-        for cell_index,cell in enumerate(row):
-            if cell.visible:
-                if len(cell.units) > 4 and len(cell.units) < 7:
-                    unit = cell.units[4]
-                    if unit in cell.units:
-                        line += f"({unit.player})"
+                    top = "   "
+                if cell_type == Terrain.MOUNTAIN or cell_type == Terrain.LAKE:
+                    top += "   "
                 else:
-                    line += (" " * 3)
-                if len(cell.units) > 5 and len(cell.units) < 7:
-                    unit = cell.units[5]
-                    if unit in cell.units:
-                        line += f"({unit.player})"
+                    index = view.board_index(row, column)
+                    if no_influence[index]:
+                        top += " N "
+                    elif control[index] < 0:
+                        top += f"{control[index]} "
+                    else:
+                        top += f" {control[index]} "
+                if count > 6:
+                    number_of_player_2_units = players.count(2)
+                    top += f"2x{number_of_player_2_units}" if number_of_player_2_units > 0 else "   "
+                elif count > 1:
+                    top += f"({players[1]})"
                 else:
-                    line += (" " * 3)
+                    top += "   "
+                top += padding
+            stacked = 2 < count < 7
+            middle = f"({players[2]})" if stacked else "   "
+            if cell_type == Terrain.MOUNTAIN:
+                middle += "^^^"
+            elif cell_type == Terrain.FOREST:
+                middle += ") ("
+            elif cell_type == Terrain.LAKE:
+                middle += "~~~"
+            elif visible and cell.city:
+                middle += f"[{cell.city}]"
             else:
-                line += (" " * (cell_width-3)) 
-            line += f"{index},{cell_index}"+ "|"
-        print(line)
-        # Print the horizontal separator after each row
-        print(horizontal_separator)
+                middle += "   "
+            middle += (f"({players[3]})" if 3 < count < 7 else "   ") + padding
+            bottom = (f"({players[4]})" if 4 < count < 7 else "   ") + (f"({players[5]})" if 5 < count < 7 else "   ")
+            bottom += f"{row},{column}".ljust(label_width)
+            cells.append((top, middle, bottom))
+        rows.append(cells)
+    return rows
+
+def compose_frame(cells: List[List[Tuple[str, str, str]]]) -> str:
+    """Join the output of ``render_cells`` into the full board text."""
+    cell_width = len(cells[0][0][0])
+    horizontal_separator = ("+" + "-" * cell_width) * len(cells[0]) + "+"
+    lines = [horizontal_separator]
+    for row in cells:
+        for line in range(3):
+            lines.append("|" + "|".join(fragments[line] for fragments in row) + "|")
+        lines.append(horizontal_separator)
+    lines.append("")
+    return "\n".join(lines)
+
+def print_board(board: "Board | PlayerView"):
+    view = board if isinstance(board, PlayerView) else PlayerView(board)
+    sys.stdout.write(compose_frame(render_cells(view)))
 
 def print_player_view(board, player):
-    board_copy = copy.deepcopy(board)
-    for row in board_copy:
-        for cell in row:
-            cell.visible = get_cell_visibility(board_copy, cell, player)
+    print_board(PlayerView(board, player))
+
+class Renderer():
+    """Draws player views in place on an ANSI terminal.
+
+    The first frame, and any frame after ``reset``, a change of player or
+    board size, clears the screen and writes the whole board. Later frames
+    only rewrite the cells whose text changed, then clear everything below
+    the board. Boards that do not fit the terminal, with room left for the
+    prompts under them, are always written whole since scrolling would
+    move the cells away from where the renderer expects them.
+    """
+    # Lines kept free under the board for the move prompts.
+    prompt_lines = MAX_PLAYER_UNITS + 5
+
+    def __init__(self, stream=None, terminal_size: Tuple[int, int] | None = None):
+        self.stream = stream
+        self.terminal_size = terminal_size
+        self.previous = None
+        self.player = None
+
+    def reset(self):
+        self.previous = None
+
+    def draw(self, view: PlayerView):
+        cells = render_cells(view)
+        cell_width = len(cells[0][0][0])
+        columns, lines = self.terminal_size or _terminal_size()
+        fits = (len(cells[0]) * (cell_width + 1) + 1 <= columns and len(cells) * 4 + 1 + self.prompt_lines <= lines)
+        previous = self.previous
+        if (not fits or previous is None or self.player != view.player
+                or len(previous) != len(cells) or len(previous[0]) != len(cells[0])):
+            output = CLEAR_SCREEN + compose_frame(cells)
+        else:
+            parts = []
+            for row, (row_cells, previous_row) in enumerate(zip(cells, previous)):
+                for column, fragments in enumerate(row_cells):
+                    if fragments != previous_row[column]:
+                        screen_column = column * (cell_width + 1) + 2
+                        for line, text in enumerate(fragments):
+                            parts.append(f"\x1b[{row * 4 + line + 2};{screen_column}H{text}")
+            parts.append(f"\x1b[{len(cells) * 4 + 2};1H\x1b[J")
+            output = "".join(parts)
+        _enable_ansi()
+        stream = self.stream or sys.stdout
+        stream.write(output)
+        stream.flush()
+        self.previous = cells
+        self.player = view.player
+
+def _terminal_size() -> Tuple[int, int]:
+    """Columns and lines of the terminal, or zero when not writing to one."""
+    if not sys.stdout.isatty():
+        return 0, 0
+    try:
+        return tuple(os.get_terminal_size(sys.stdout.fileno()))
+    except (OSError, ValueError):
+        return 0, 0
+
+_renderer = Renderer()
+
+def draw_player_view(board: Board, player: int):
+    """Show the player's view of the board on the terminal, redrawing only
+    what changed since the last call."""
+    _renderer.draw(PlayerView(board, player))
+
+def create_board(game_map: gamemap.GameMap) -> Board:
+    """Return an empty board with the map's size and terrain."""
+    cells = [Cell() for _ in range(game_map.height * game_map.width)]
+    for cell, terrain in zip(cells, game_map.terrain):
+        if terrain != "plain":
+            cell.type = terrain
+    grid = [cells[row * game_map.width:(row + 1) * game_map.width] for row in range(game_map.height)]
+    return Board(grid, game_map.neighbors, game_map.mirror, game_map.zone)
+
+def place_map_start(board: Board, game_map: gamemap.GameMap):
+    """Build the map's cities and place its starting units."""
+    for index, player in game_map.cities.items():
+        board.cell(*divmod(index, board.width)).city = player
+    for index, player in game_map.units:
+        add_unit(board, Unit(player), board.cells[index])
+
+def create_standard_board() -> Board:
+    return create_board(gamemap.standard_map())
+
+def mirror_position(board: Board, row: int, column: int, player: int) -> Tuple[int, int]:
+    """Translate between a player's own coordinates and board coordinates.
+
+    Player 2 sees the board rotated half a turn; the translation is its own
+    inverse.
+    """
     if player == 2:
-        #mirror the board
-        for row in board_copy:
-            row.reverse()
-        board_copy.reverse()
-        # flip all player related values
-        for row in board_copy:
-            for cell in row:
-                for unit in cell.units:
-                    if unit.player == 1:
-                        unit.player = 2
-                    else:
-                        unit.player = 1
-                if cell.city:
-                    if cell.city == 1:
-                        cell.city = 2
-                    else:
-                        cell.city = 1
-    print_board(board_copy)
-
-def create_standard_board() -> List[List[Cell]]:
-    board = [[Cell() for _ in range(9)] for _ in range(9)]
-    board[4][4].type = "mountain"
-    board[2][2].type = "forest"
-    board[6][6].type = "forest"
-    board[2][6].type = "lake"
-    board[6][2].type = "lake"
-    return board
-
-def validate_user_input_coordinates(user_input: str) -> Tuple[int, int]:
+        return divmod(board.mirror[row * board.width + column], board.width)
+    return row, column
+
+def validate_user_input_coordinates(user_input: str, board: Board | None = None) -> Tuple[int, int]:
+    height, width = (9, 9) if board is None else (board.height, board.width)
     row = int(user_input.split(",")[0])
     column = int(user_input.split(",")[1])
-    if row < 0 or row > 8 or column < 0 or column > 8:
-        print("Invalid input, row and column must be between 0 and 8")
+    if row < 0 or row >= height or column < 0 or column >= width:
+        if height == width:
+            print(f"Invalid input, row and column must be between 0 and {height - 1}")
+        else:
+            print(f"Invalid input, row must be between 0 and {height - 1} and column between 0 and {width - 1}")
         return None
     return row, column
 
 
-def get_player_coordinate_input(message: str) -> Tuple[int, int] | None:
+def get_player_coordinate_input(message: str, board: Board | None = None) -> Tuple[int, int] | None:
     while True:
         try:
             user_input = input(message)
-            return validate_user_input_coordinates(user_input)
+            return validate_user_input_coordinates(user_input, board)
         except Exception:
             print("Invalid input, please enter row and column as integers separated by a comma")
             continue
 
-def place_city(board: List[List[Cell]], player: int):
+def place_city(board: Board, player: int):
     while True:
-        row, column = get_player_coordinate_input(f"Player {player}, enter city coordinates in format row, column: ")
-        if row < 6 or column > 8:
-            print("Invalid city placement, city should be built on the last 3 rows")
+        row, column = get_player_coordinate_input(f"Player {player}, enter city coordinates in format row, column: ", board)
+        if row < board.height - board.zone:
+            print(f"Invalid city placement, city should be built on the last {board.zone} rows")
             continue
-        if player == 2:
-            row = 8 - row
-            column = 8 - column
+        row, column = mirror_position(board, row, column, player)
         cell = board[row][column]
-        if cell.type != "plain":
+        if cell.type != Terrain.PLAIN:
             print("Invalid coordinates, city should be built on a plain")
             continue
         cell.city = player
@@ -405,44 +1417,40 @@ def place_city(board: List[List[Cell]], player: int):
 
 def place_cities(board):
     # Call the function with the board
-    print_player_view(board, 1)
+    draw_player_view(board, 1)
     place_city(board, 1)
     switch_players()
-    print_player_view(board, 2)
+    draw_player_view(board, 2)
     place_city(board, 2)
 
-def place_player_units(board: List[List[Cell]], player: int):
+def place_player_units(board: Board, player: int):
     for i in range(7):
         while True:
-            row, column = get_player_coordinate_input(f"Player {player}, enter unit coordinates for {i} in format row, column: ")
-            if row < 6 or row > 8:
-                print("Invalid unit placement, unit should be built on the last 3 rows.")
+            row, column = get_player_coordinate_input(f"Player {player}, enter unit coordinates for {i} in format row, column: ", board)
+            if row < board.height - board.zone:
+                print(f"Invalid unit placement, unit should be built on the last {board.zone} rows.")
                 continue
-            if player == 2:
-                row = 8 - row
-                column = 8 - column
+            row, column = mirror_position(board, row, column, player)
             try:
                 target_cell = board[row][column]
                 add_unit(board, Unit(player), target_cell)
             except Exception as e:
                 print(e)
                 continue
-            clear_console()
-            print_player_view(board, player)
+            draw_player_view(board, player)
             break
 
 def place_units(board):
-    print_player_view(board, 1)
+    draw_player_view(board, 1)
     place_player_units(board, 1)
     clear_console()
     input("Give board to player 2, then press enter to continue")
     clear_console()
-    print_player_view(board, 2)
+    draw_player_view(board, 2)
     place_player_units(board, 2)
 
-def get_player_moves(board: List[List[Cell]], player: int) -> list[tuple[Unit, Cell]]:
-    clear_console()
-    print_player_view(board, player)
+def get_player_moves(board: Board, player: int) -> list[tuple[Unit, Cell]]:
+    draw_player_view(board, player)
     units = get_player_units(board, player)
     if player == 2:
         units.reverse()
@@ -454,23 +1462,15 @@ def get_player_moves(board: List[List[Cell]], player: int) -> list[tuple[Unit, C
                 unit_cell = get_unit_cell(board, old_unit)
                 unit_cell_row, unit_cell_col = get_cell_position(board, unit_cell)
                 target_cell_row, target_cell_col = get_cell_position(board, target_cell)
-                if player == 2:
-                    unit_cell_row = 8 - unit_cell_row
-                    unit_cell_col = 8 - unit_cell_col
-                    target_cell_row = 8 - target_cell_row
-                    target_cell_col = 8 - target_cell_col
+                unit_cell_row, unit_cell_col = mirror_position(board, unit_cell_row, unit_cell_col, player)
+                target_cell_row, target_cell_col = mirror_position(board, target_cell_row, target_cell_col, player)
                 print(f"Moving unit from {unit_cell_row}, {unit_cell_col} to {target_cell_row}, {target_cell_col}")
-            row,column = get_unit_position(board, unit)
-            if player == 2:
-                row = 8 - row
-                column = 8 - column
+            row, column = mirror_position(board, *get_unit_position(board, unit), player)
             input_string = input(f"{player}, Enter move for unit at {row}, {column} in format row, column, or enter to skip:")
             if not input_string:
                 break
-            end_row, end_column = validate_user_input_coordinates(input_string)
-            if player == 2:
-                end_row = 8 - end_row
-                end_column = 8 - end_column
+            end_row, end_column = validate_user_input_coordinates(input_string, board)
+            end_row, end_column = mirror_position(board, end_row, end_column, player)
             target_cell = board[end_row][end_column]
             if validate_unit_move(board, unit, target_cell):
                 player_moves.append((unit, target_cell))
@@ -478,8 +1478,7 @@ def get_player_moves(board: List[List[Cell]], player: int) -> list[tuple[Unit, C
             else:
                 print("Invalid move, please try again.")
                 continue
-        clear_console()
-        print_player_view(board, player)
+        draw_player_view(board, player)
     return player_moves
 
 def switch_players():
@@ -487,35 +1486,69 @@ def switch_players():
     input("Give board to other player, then press enter to continue")
     clear_console()
 
-def place_starter_units(board: List[List[Cell]]):
-    board[7][1].city = 1
-    board[1][7].city = 2
-    for i in range(7):
-        add_unit(board, Unit(1), board[8][i])
-        add_unit(board, Unit(2), board[0][8-i])
+def place_starter_units(board: Board):
+    place_map_start(board, gamemap.standard_map())
 
 if __name__ == "__main__":
-    board = create_standard_board()
+    parser = argparse.ArgumentParser(description="Play 7-stones in the terminal.")
+    parser.add_argument("--computer", type=int, choices=(1, 2), action="append", default=[],
+                        help="let the computer play this player (may be given twice)")
+    parser.add_argument("--think-time", type=float, default=2.0, help="computer search time per turn in seconds")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes for the computer search")
+    parser.add_argument("--profile", metavar="PATH", help="append a per-turn timing summary to this JSONL file")
+    parser.add_argument("--map", metavar="PATH", help="play on this map file instead of the standard board")
+    parser.add_argument("--record", metavar="PATH", help="append the game to this archive, even if it is interrupted")
+    args = parser.parse_args()
+    if args.profile:
+        instrument.enable(args.profile, sys.modules[__name__])
+    computers = {}
+    if args.computer:
+        import ai
+        computers = {player: ai.MCTSPlayer(time_limit=args.think_time, processes=args.processes) for player in args.computer}
+    hot_seat = not computers
+    game_map = gamemap.standard_map() if args.map is None else gamemap.load_map(args.map)
+    board = create_board(game_map)
     # place_cities(board)
     # switch_players()
     # place_units(board)
     # switch_players()
-    place_starter_units(board)
+    place_map_start(board, game_map)
+    recorder = None
+    if args.record:
+        import gamerecord
+        recorder = gamerecord.GameRecorder(board)
     winner = None
-    while winner is None:
-        player_moves = []
-        player_moves.extend(get_player_moves(board, 1))
-        switch_players()
-        player_moves.extend(get_player_moves(board, 2))
-        for player_move in player_moves:
-            (unit, target_cell) = player_move
-            move_unit(board, unit, target_cell)
-        resolve_units(board)
-        winner = check_for_winner(board)
-        switch_players()
+    # An interrupted game is still recorded, without a winner.
+    try:
+        while winner is None:
+            player_moves = {}
+            for player in (1, 2):
+                with instrument.phase("input"):
+                    if player in computers:
+                        player_moves[player] = computers[player].choose_moves(board, player)
+                    else:
+                        player_moves[player] = get_player_moves(board, player)
+                    if player == 1 and hot_seat:
+                        switch_players()
+            if recorder is not None:
+                recorder.record_turn(board, player_moves[1] + player_moves[2])
+            with instrument.phase("move application"):
+                apply_turn(board, player_moves[1], player_moves[2])
+            with instrument.phase("resolution"):
+                resolve_units(board)
+            board.turn += 1
+            with instrument.phase("winner check"):
+                winner = check_for_winner(board)
+            instrument.end_turn()
+            if hot_seat:
+                switch_players()
+    finally:
+        for computer in computers.values():
+            computer.close()
+        if recorder is not None:
+            with gamerecord.ArchiveWriter(args.record) as writer:
+                writer.write(recorder.finish(winner))
     if winner == 3:
         print("Game ended in a draw")
     else:
         print(f"Player {winner} wins!")
-
-        
@@ -0,0 +1,153 @@
+"""Opt-in instrumentation of the rules engine and the turn loop.
+
+Nothing here costs anything until ``enable`` is called: the rules functions
+in ``grid`` are only wrapped while a profiler is active, and ``phase``
+returns a shared no-op context manager otherwise.
+
+Once enabled, every call to the functions in ``PRIMITIVES`` is counted and
+timed (inclusive of the functions it calls), and the turn loop reports the
+time spent in each of its phases. Phase times are exclusive, so rendering
+done while waiting for input is booked to "render" and not to "input".
+``end_turn`` appends one JSON line per turn to the profile file.
+
+Run a profiled game with ``python grid.py --profile turns.jsonl``.
+"""
+import contextlib
+from functools import wraps
+import json
+import time
+from typing import Dict, List
+
+PRIMITIVES = (
+    "get_cell_position",
+    "get_adjacent_cells",
+    "get_cell_control",
+    "compute_control_map",
+    "label_regions",
+    "get_contiguous_controlled_or_contested_cells",
+    "check_for_freedom",
+    "compute_visibility_map",
+    "get_cell_visibility",
+    "validate_unit_move",
+    "move_unit",
+    "apply_turn",
+    "resolve_units",
+    "check_for_winner",
+)
+RENDERERS = ("print_board", "print_player_view", "draw_player_view")
+
+_NO_PHASE = contextlib.nullcontext()
+_profiler = None
+_originals = []
+
+
+class Profiler():
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.turn = 0
+        self.calls: Dict[str, List[float]] = {}
+        self.phases: Dict[str, float] = {}
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def record(self, name: str, seconds: float):
+        stats = self.calls.get(name)
+        if stats is None:
+            self.calls[name] = [1, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "turn": self.turn,
+            "phases": dict(self.phases),
+            "calls": {name: {"count": count, "seconds": seconds} for name, (count, seconds) in sorted(self.calls.items())},
+        }
+
+    def end_turn(self) -> Dict[str, object]:
+        """Return the summary of the turn, log it and start the next turn."""
+        self.turn += 1
+        summary = self.summary()
+        if self.path:
+            with open(self.path, "a") as log:
+                log.write(json.dumps(summary) + "\n")
+        self.calls = {}
+        self.phases = {}
+        return summary
+
+
+def _timed(profiler: Profiler, name: str, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _rendering(profiler: Profiler, name: str, function):
+    timed = _timed(profiler, name, function)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with profiler.phase("render"):
+            return timed(*args, **kwargs)
+    return wrapper
+
+
+def enable(path: str | None = None, *modules) -> Profiler:
+    """Start profiling, wrapping the functions being measured in ``grid``
+    and in any other module running the rules code (such as ``__main__``
+    when ``grid.py`` is run as a script)."""
+    global _profiler
+    import grid
+    disable()
+    _profiler = Profiler(path)
+    for module in (grid, *(module for module in modules if module is not grid)):
+        for name in PRIMITIVES + RENDERERS:
+            function = getattr(module, name)
+            _originals.append((module, name, function))
+            wrap = _rendering if name in RENDERERS else _timed
+            setattr(module, name, wrap(_profiler, name, function))
+    return _profiler
+
+
+def disable():
+    """Stop profiling and put the original functions back."""
+    global _profiler
+    for module, name, function in reversed(_originals):
+        setattr(module, name, function)
+    _originals.clear()
+    _profiler = None
+
+
+def active() -> Profiler | None:
+    return _profiler
+
+
+def phase(name: str):
+    """Context manager timing a phase of the turn loop, if profiling."""
+    if _profiler is None:
+        return _NO_PHASE
+    return _profiler.phase(name)
+
+
+def end_turn() -> Dict[str, object] | None:
+    if _profiler is None:
+        return None
+    return _profiler.end_turn()
@@ -0,0 +1,148 @@
+"""Load test for ``server``: many random bots playing concurrent matches.
+
+Bots keep joining matches until ``bots * matches / 2`` matches have
+finished, moving every unit to a random open neighboring cell each turn.
+Turn latency is the time from a bot sending its moves to receiving the next
+turn, which includes waiting for the other player's moves and resolving the
+turn. Without ``--port`` a server is
+started in the same process:
+
+    python loadtest.py --bots 200 --matches 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+import grid
+import server
+
+OPEN = (int(grid.Terrain.PLAIN), int(grid.Terrain.FOREST))
+
+
+def random_moves(view: Dict[str, object], rng: random.Random) -> List[List[int]]:
+    """Random moves for every unit of the viewing player, who is always 1."""
+    cells = view["cells"]
+    height, width = view["height"], view["width"]
+    moves = []
+    for row in range(height):
+        for column in range(width):
+            cell = cells[row][column]
+            if len(cell) == 1:
+                continue
+            for player in cell[2]:
+                if player != 1:
+                    continue
+                targets = [(row, column)]
+                for target_row, target_column in ((row - 1, column), (row + 1, column), (row, column - 1), (row, column + 1)):
+                    if 0 <= target_row < height and 0 <= target_column < width \
+                            and cells[target_row][target_column][0] in OPEN:
+                        targets.append((target_row, target_column))
+                target_row, target_column = rng.choice(targets)
+                if (target_row, target_column) != (row, column):
+                    moves.append([row, column, target_row, target_column])
+    return moves
+
+
+class Progress():
+    def __init__(self, target: int):
+        self.target = target
+        self.ends = 0
+        self.done = asyncio.Event()
+
+    def match_ended(self):
+        # Both players of a match see its end.
+        self.ends += 1
+        if self.ends >= 2 * self.target:
+            self.done.set()
+
+
+async def bot(host: str, port: int, seed: int, latencies: List[float], progress: Progress):
+    """Play matches until the load test has seen enough of them."""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=server.LINE_LIMIT)
+    try:
+        while not progress.done.is_set():
+            writer.write(b'{"type":"join"}\n')
+            sent = None
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                message = json.loads(line)
+                if message["type"] == "turn":
+                    if sent is not None:
+                        latencies.append(time.perf_counter() - sent)
+                    moves = random_moves(message["view"], rng)
+                    writer.write(json.dumps({"type": "moves", "turn": message["turn"], "moves": moves}).encode() + b"\n")
+                    sent = time.perf_counter()
+                elif message["type"] == "end":
+                    progress.match_ended()
+                    break
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+class LoadReport():
+    def __init__(self, matches: int, seconds: float, latencies: List[float]):
+        self.matches = matches
+        self.seconds = seconds
+        self.latencies = sorted(latencies)
+
+    @property
+    def matches_per_second(self) -> float:
+        return self.matches / self.seconds if self.seconds else float("inf")
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        return self.latencies[min(len(self.latencies) - 1, int(fraction * len(self.latencies)))]
+
+    def summary(self) -> str:
+        mean = statistics.fmean(self.latencies) if self.latencies else 0.0
+        return (f"{self.matches} matches in {self.seconds:.2f}s ({self.matches_per_second:.1f} matches/sec), "
+                f"{len(self.latencies)} turns | turn latency mean {mean * 1000:.2f}ms, "
+                f"p50 {self.percentile(0.5) * 1000:.2f}ms, p95 {self.percentile(0.95) * 1000:.2f}ms, "
+                f"max {self.percentile(1.0) * 1000:.2f}ms")
+
+
+async def run_load_test(bots: int, matches: int, host: str = "127.0.0.1", port: int | None = None,
+                        seed: int = 0, max_turns: int = 200) -> LoadReport:
+    """Run ``bots`` bots against the server at ``port``, or against one started
+    here on a free port, until ``bots * matches / 2`` matches have finished."""
+    game_server = None
+    if port is None:
+        game_server = server.GameServer(max_turns=max_turns)
+        await game_server.start(host, 0)
+        port = game_server.port
+    latencies = []
+    progress = Progress(max(1, bots * matches // 2))
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(bot(host, port, seed + index, latencies, progress)) for index in range(bots)]
+    try:
+        await progress.done.wait()
+        seconds = time.perf_counter() - start
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if game_server is not None:
+            await game_server.stop()
+    return LoadReport(progress.ends // 2, seconds, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test a 7-stones server with random bots.")
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--matches", type=int, default=5, help="matches each bot plays")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="server to test; starts one in process if omitted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=200, help="turn limit of the in-process server")
+    args = parser.parse_args()
+    report = asyncio.run(run_load_test(args.bots, args.matches, args.host, args.port, args.seed, args.max_turns))
+    print(report.summary())
@@ -0,0 +1,169 @@
+"""The original rules of 7-stones, kept as a frozen reference.
+
+These are the control, freedom, resolution and winner functions as they
+were before any of the engines were optimized, working cell by cell on a
+plain list of lists of cells. They are slow on purpose and must not be
+changed to follow the engines; ``fuzz`` compares every engine against them.
+The only difference from the original code is that cells know their own
+position instead of being searched for on the board.
+
+Build a reference board from a ``grid.Board`` with ``from_board``.
+"""
+from typing import List, Set
+
+import grid
+
+
+class Cell():
+    def __init__(self, row: int, column: int, city: int | None = None):
+        self.row = row
+        self.column = column
+        self.city = city
+        self.units = []
+
+
+class Unit():
+    def __init__(self, player: int, control: int = 1):
+        self.player = player
+        self.control = control
+
+
+def from_board(board: grid.Board) -> List[List[Cell]]:
+    rows = []
+    for row in board:
+        cells = []
+        for cell in row:
+            copy = Cell(cell.row, cell.column, cell.city)
+            copy.units = [Unit(unit.player, unit.control) for unit in cell.units]
+            cells.append(copy)
+        rows.append(cells)
+    return rows
+
+
+def get_adjacent_cells(board: List[List[Cell]], cell: Cell) -> Set[Cell]:
+    adjacent_cells = set()
+    row, column = cell.row, cell.column
+    if row > 0:
+        adjacent_cells.add(board[row-1][column])
+    if row < len(board) - 1:
+        adjacent_cells.add(board[row+1][column])
+    if column > 0:
+        adjacent_cells.add(board[row][column-1])
+    if column < len(board[0]) - 1:
+        adjacent_cells.add(board[row][column+1])
+    return adjacent_cells
+
+
+def get_cells_adjacent_to_set(board: List[List[Cell]], cells: Set[Cell]) -> Set[Cell]:
+    adjacent_cells = set()
+    for cell in cells:
+        adjacent_cells.update(get_adjacent_cells(board, cell))
+    return adjacent_cells - cells
+
+
+def get_cell_control(board: List[List[Cell]], cell: Cell) -> int | None:
+    player_1_control = 0
+    player_2_control = 0
+    cells_to_check = [cell]
+    adjacent_cells = get_adjacent_cells(board, cell)
+    cells_to_check.extend(adjacent_cells)
+    for current_cell in cells_to_check:
+        for unit in current_cell.units:
+            if unit.player == 1:
+                player_1_control += unit.control
+            else:
+                player_2_control += unit.control
+    if player_1_control == 0 and player_2_control == 0 and not cell.city:
+        return None
+    else:
+        return player_1_control - player_2_control
+
+
+def check_player_control(control_value: int | None, player: int) -> bool:
+    if control_value is None:
+        return False
+    return control_value > 0 if player == 1 else control_value < 0
+
+
+def check_player_controls_cell(board: List[List[Cell]], cell: Cell, player: int) -> bool:
+    control_value = get_cell_control(board, cell)
+    return check_player_control(control_value, player)
+
+
+def get_contiguous_controlled_or_contested_cells(board: List[List[Cell]], cell: Cell, player: int) -> Set[Cell]:
+    def controlled_or_contested(cell, player):
+        control_value = get_cell_control(board, cell)
+        return control_value == 0 or check_player_control(control_value, player)
+
+    if controlled_or_contested(cell, player):
+        contiguous_cells = {cell}
+        while True:
+            new_cells = get_cells_adjacent_to_set(board, contiguous_cells)
+            new_controlled_or_contested_cells = {new_cell for new_cell in new_cells if controlled_or_contested(new_cell, player)}
+            if not new_controlled_or_contested_cells:
+                break
+            contiguous_cells.update(new_controlled_or_contested_cells)
+
+        return contiguous_cells
+    else:
+        return set()
+
+
+def get_opposing_player(player: int) -> int:
+    return 1 if player == 2 else 2
+
+
+def check_for_freedom(board: List[List[Cell]], cell: Cell, player: int) -> bool:
+    opponent = get_opposing_player(player)
+    if check_player_controls_cell(board, cell, opponent):
+        return False
+    contiguous_cells = get_contiguous_controlled_or_contested_cells(board, cell, player)
+    adjacent_cells = get_cells_adjacent_to_set(board, contiguous_cells)
+    if all(check_player_controls_cell(board, adjacent_cell, opponent) for adjacent_cell in adjacent_cells):
+        return False
+    return True
+
+
+def remove_unit(board: List[List[Cell]], unit: Unit):
+    for row in board:
+        for cell in row:
+            if unit in cell.units:
+                cell.units.remove(unit)
+                return
+
+
+def resolve_units(board: List[List[Cell]]):
+    while True:
+        units_to_be_removed = []
+        for row in board:
+            for cell in row:
+                if cell.units:
+                    player_1_units = [unit for unit in cell.units if unit.player == 1]
+                    if len(player_1_units) > 0:
+                        if not check_for_freedom(board, cell, 1):
+                            for unit in player_1_units:
+                                units_to_be_removed.append(unit)
+                    player_2_units = [unit for unit in cell.units if unit.player == 2]
+                    if len(player_2_units) > 0:
+                        if not check_for_freedom(board, cell, 2):
+                            for unit in player_2_units:
+                                units_to_be_removed.append(unit)
+
+        if len(units_to_be_removed) == 0:
+            break
+        for unit in units_to_be_removed:
+            remove_unit(board, unit)
+
+
+def check_for_winner(board: List[List[Cell]]) -> int | None:
+    winners = []
+    for row in board:
+        for cell in row:
+            if cell.city:
+                if not check_for_freedom(board, cell, cell.city):
+                    winners.append(get_opposing_player(cell.city))
+    if len(winners) == 1:
+        return winners[0]
+    elif len(winners) == 2:
+        return 3
+    return None
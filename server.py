@@ -0,0 +1,271 @@
+"""Asyncio server hosting 7-stones matches over TCP.
+
+Clients speak newline-delimited JSON. A client sends ``{"type": "join"}``
+and waits in the lobby until a second client joins; the two then play a
+match on a board of their own. Every message from the server carries the
+receiving player's view of the board, mirrored so that they play from the
+bottom as player 1 and limited to what they can see:
+
+    {"type": "start", "player": 1, "view": ...}
+    {"type": "turn", "turn": 0, "deadline": 30.0, "view": ...}
+    {"type": "end", "winner": 1, "view": ...}
+
+``view`` holds ``height``, ``width`` and ``cells``, a list of rows of cells.
+A visible cell is ``[terrain, city, players, control]``, a hidden one is
+just ``[terrain]``. Terrain is a ``grid.Terrain`` value, and city owners,
+unit players, control and the winner are relabeled like the view (the
+receiving player is always 1; a winner of 3 is a draw, and None means the
+turn limit was reached).
+
+Both players answer each turn with their moves, in view coordinates:
+
+    {"type": "moves", "turn": 0, "moves": [[row, column, target_row, target_column], ...]}
+
+A submission replaces any earlier one for the turn, and an invalid one is
+answered with ``{"type": "error", "message": ...}``. The turn is resolved
+once both players have submitted or its deadline has passed; a player who
+submitted nothing keeps their units where they are. A player who
+disconnects forfeits the match.
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, List, Tuple
+
+import gamemap
+import grid
+
+LINE_LIMIT = 1 << 24
+
+
+def encode_view(board: grid.Board, player: int) -> Dict[str, object]:
+    view = grid.PlayerView(board, player)
+    cells = []
+    for row in view:
+        cells.append([[int(cell.type), cell.city or 0, cell.players, cell.control] if cell.visible else [int(cell.type)]
+                      for cell in row])
+    return {"height": view.height, "width": view.width, "cells": cells}
+
+
+def parse_moves(board: grid.Board, player: int, moves: List[List[int]]) -> List[Tuple[grid.Unit, grid.Cell]]:
+    """Turn moves in the player's view coordinates into ``(unit, target
+    cell)`` pairs, raising ValueError if any of them is not legal."""
+    player_moves = []
+    moved = set()
+    for move in moves:
+        if len(move) != 4 or not all(isinstance(value, int) for value in move):
+            raise ValueError("A move is [row, column, target_row, target_column]")
+        positions = []
+        for row, column in (move[:2], move[2:]):
+            if not (0 <= row < board.height and 0 <= column < board.width):
+                raise ValueError(f"{row}, {column} is not on the board")
+            positions.append(grid.mirror_position(board, row, column, player))
+        (row, column), (target_row, target_column) = positions
+        unit = next((unit for unit in board[row][column].units if unit.player == player and unit not in moved), None)
+        if unit is None:
+            raise ValueError(f"No unit left to move at {move[0]}, {move[1]}")
+        target_cell = board[target_row][target_column]
+        error = grid.get_move_error(board, unit, target_cell)
+        if error:
+            raise ValueError(error)
+        moved.add(unit)
+        player_moves.append((unit, target_cell))
+    return player_moves
+
+
+class Connection():
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.match = None
+        self.player = None
+
+    async def receive(self) -> Dict[str, object] | None:
+        line = await self.reader.readline()
+        if not line:
+            return None
+        message = json.loads(line)
+        if not isinstance(message, dict):
+            raise ValueError("Messages must be JSON objects")
+        return message
+
+    def send(self, message: Dict[str, object]):
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class Match():
+    def __init__(self, connections: Tuple[Connection, Connection], game_map: gamemap.GameMap,
+                 turn_timeout: float, max_turns: int):
+        self.connections = {1: connections[0], 2: connections[1]}
+        self.board = grid.create_board(game_map)
+        grid.place_map_start(self.board, game_map)
+        self.turn_timeout = turn_timeout
+        self.max_turns = max_turns
+        self.submissions: Dict[int, List[Tuple[grid.Unit, grid.Cell]]] = {}
+        self.submitted = asyncio.Event()
+        self.forfeited = None
+        self.winner = None
+        for player, connection in self.connections.items():
+            connection.match = self
+            connection.player = player
+
+    def relabel(self, player: int, value: int | None) -> int | None:
+        if value in (1, 2) and player == 2:
+            return grid.get_opposing_player(value)
+        return value
+
+    def broadcast(self, message_type: str, **fields):
+        for player, connection in self.connections.items():
+            message = {"type": message_type, **fields, "view": encode_view(self.board, player)}
+            if message_type == "start":
+                message["player"] = player
+            if "winner" in fields:
+                message["winner"] = self.relabel(player, fields["winner"])
+            connection.send(message)
+
+    def submit(self, player: int, message: Dict[str, object]):
+        connection = self.connections[player]
+        if self.winner is not None or message.get("turn") != self.board.turn:
+            connection.send({"type": "error", "message": "Moves are not for the current turn"})
+            return
+        try:
+            self.submissions[player] = parse_moves(self.board, player, message.get("moves", []))
+        except (ValueError, TypeError) as error:
+            connection.send({"type": "error", "message": str(error)})
+            return
+        if len(self.submissions) == 2:
+            self.submitted.set()
+
+    def forfeit(self, player: int):
+        if self.forfeited is None:
+            self.forfeited = player
+        self.submitted.set()
+
+    async def play(self) -> int | None:
+        self.broadcast("start")
+        while self.board.turn < self.max_turns:
+            self.broadcast("turn", turn=self.board.turn, deadline=self.turn_timeout)
+            try:
+                await asyncio.wait_for(self.submitted.wait(), self.turn_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self.forfeited is not None:
+                self.winner = grid.get_opposing_player(self.forfeited)
+                break
+            player_moves = self.submissions
+            self.submissions = {}
+            self.submitted.clear()
+            grid.apply_turn(self.board, player_moves.get(1, []), player_moves.get(2, []))
+            grid.resolve_units(self.board)
+            self.board.turn += 1
+            self.winner = grid.check_for_winner(self.board)
+            if self.winner is not None:
+                break
+        self.broadcast("end", winner=self.winner)
+        for connection in self.connections.values():
+            connection.match = None
+        return self.winner
+
+
+class GameServer():
+    """Pairs up clients as they join and runs their matches concurrently."""
+    def __init__(self, game_map: gamemap.GameMap | None = None, turn_timeout: float = 30.0, max_turns: int = 200):
+        self.game_map = game_map or gamemap.standard_map()
+        self.turn_timeout = turn_timeout
+        self.max_turns = max_turns
+        self.waiting: Connection | None = None
+        self.active = set()
+        self.handlers: Dict[asyncio.Task, Connection] = {}
+        self.matches_played = 0
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 7777) -> asyncio.AbstractServer:
+        self.server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        return self.server
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(reader, writer)
+        handler = asyncio.current_task()
+        self.handlers[handler] = connection
+        try:
+            while True:
+                try:
+                    message = await connection.receive()
+                except ConnectionError:
+                    break
+                except ValueError as error:
+                    connection.send({"type": "error", "message": f"Invalid message: {error}"})
+                    continue
+                if message is None:
+                    break
+                if message.get("type") == "join":
+                    self.join(connection)
+                elif message.get("type") == "moves" and connection.match is not None:
+                    connection.match.submit(connection.player, message)
+                else:
+                    connection.send({"type": "error", "message": "Unexpected message"})
+                await writer.drain()
+        finally:
+            if self.waiting is connection:
+                self.waiting = None
+            if connection.match is not None:
+                connection.match.forfeit(connection.player)
+            writer.close()
+            self.handlers.pop(handler, None)
+
+    def join(self, connection: Connection):
+        if connection.match is not None or self.waiting is connection:
+            connection.send({"type": "error", "message": "Already playing"})
+        elif self.waiting is None:
+            self.waiting = connection
+        else:
+            match = Match((self.waiting, connection), self.game_map, self.turn_timeout, self.max_turns)
+            self.waiting = None
+            task = asyncio.create_task(self._play(match))
+            self.active.add(task)
+            task.add_done_callback(self.active.discard)
+
+    async def _play(self, match: Match):
+        await match.play()
+        self.matches_played += 1
+        for connection in match.connections.values():
+            if not connection.writer.is_closing():
+                try:
+                    await connection.writer.drain()
+                except ConnectionError:
+                    pass
+
+    async def stop(self):
+        """Stop accepting clients and end every match and connection."""
+        if self.server is not None:
+            self.server.close()
+        for task in self.active:
+            task.cancel()
+        # Closing the connections lets their handlers finish on their own.
+        for connection in self.handlers.values():
+            connection.writer.close()
+        await asyncio.gather(*self.active, *self.handlers, return_exceptions=True)
+
+
+async def serve(host: str, port: int, game_map: gamemap.GameMap | None, turn_timeout: float, max_turns: int):
+    game_server = GameServer(game_map, turn_timeout, max_turns)
+    server = await game_server.start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host 7-stones matches over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--map", metavar="PATH", help="map file to play on instead of the standard board")
+    parser.add_argument("--turn-timeout", type=float, default=30.0, help="seconds players have to submit their moves")
+    parser.add_argument("--max-turns", type=int, default=200)
+    args = parser.parse_args()
+    game_map = gamemap.load_map(args.map) if args.map else None
+    asyncio.run(serve(args.host, args.port, game_map, args.turn_timeout, args.max_turns))
@@ -0,0 +1,143 @@
+"""Headless self-play for balance testing.
+
+``simulate_game`` plays one seeded game between two policies using the same
+rules as the hot-seat loop in ``grid`` but without any input or output, and
+``run_batch`` spreads many seeded games over a process pool. Policies are
+plain functions ``policy(board, player, rng)`` returning the player's
+``(unit, target_cell)`` moves for the turn; they must be defined at module
+level so worker processes can unpickle them.
+
+With ``record`` set, each result carries a ``gamerecord.GameRecord`` of the
+game, and the command line can append them to an archive with ``--record``.
+"""
+import argparse
+from functools import partial
+import multiprocessing
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+import grid
+import gamerecord
+
+Policy = Callable[[grid.Board, int, random.Random], List[Tuple[grid.Unit, grid.Cell]]]
+
+
+def standard_start() -> grid.Board:
+    board = grid.create_standard_board()
+    grid.place_starter_units(board)
+    return board
+
+
+def stay_policy(board: grid.Board, player: int, rng: random.Random) -> List[Tuple[grid.Unit, grid.Cell]]:
+    return []
+
+
+def random_policy(board: grid.Board, player: int, rng: random.Random) -> List[Tuple[grid.Unit, grid.Cell]]:
+    """Move every unit to a random reachable cell, possibly its own."""
+    moves = []
+    for unit in grid.get_player_units(board, player):
+        targets = board.reachable(unit.movement)[board.unit_cells[unit]]
+        moves.append((unit, board.cells[rng.choice(targets)]))
+    return moves
+
+
+class GameResult():
+    """Outcome of one simulated game. ``winner`` is 1, 2, 3 for a draw, or
+    None when the turn limit was reached first."""
+    def __init__(self, seed: int, winner: int | None, turns: int, record: "gamerecord.GameRecord | None" = None):
+        self.seed = seed
+        self.winner = winner
+        self.turns = turns
+        self.record = record
+
+    def __repr__(self):
+        return f"GameResult(seed={self.seed}, winner={self.winner}, turns={self.turns})"
+
+
+def simulate_game(policy1: Policy, policy2: Policy, seed: int, max_turns: int = 200,
+                  board_factory: Callable[[], grid.Board] = standard_start, record: bool = False) -> GameResult:
+    rng = random.Random(seed)
+    board = board_factory()
+    recorder = gamerecord.GameRecorder(board) if record else None
+    winner = None
+    turn = 0
+    for turn in range(1, max_turns + 1):
+        player_1_moves = policy1(board, 1, rng)
+        player_2_moves = policy2(board, 2, rng)
+        if recorder is not None:
+            recorder.record_turn(board, player_1_moves + player_2_moves)
+        grid.apply_turn(board, player_1_moves, player_2_moves)
+        grid.resolve_units(board)
+        board.turn += 1
+        winner = grid.check_for_winner(board)
+        if winner is not None:
+            break
+    return GameResult(seed, winner, turn, recorder.finish(winner) if recorder is not None else None)
+
+
+class BatchReport():
+    def __init__(self, results: List[GameResult], seconds: float):
+        self.results = results
+        self.seconds = seconds
+        self.games = len(results)
+        self.outcomes: Dict[int | None, int] = {1: 0, 2: 0, 3: 0, None: 0}
+        for result in results:
+            self.outcomes[result.winner] += 1
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else float("inf")
+
+    @property
+    def mean_turns(self) -> float:
+        return sum(result.turns for result in self.results) / self.games if self.games else 0.0
+
+    def rate(self, outcome: int | None) -> float:
+        return self.outcomes[outcome] / self.games if self.games else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.games} games in {self.seconds:.2f}s ({self.games_per_second:.1f} games/sec), "
+                f"mean {self.mean_turns:.1f} turns | "
+                f"player 1 {self.rate(1):.1%}, player 2 {self.rate(2):.1%}, "
+                f"draw {self.rate(3):.1%}, unfinished {self.rate(None):.1%}")
+
+
+def run_batch(policy1: Policy, policy2: Policy, games: int, seed: int = 0, processes: int | None = None,
+              max_turns: int = 200, board_factory: Callable[[], grid.Board] = standard_start,
+              record: bool = False) -> BatchReport:
+    """Play ``games`` games with seeds ``seed, seed + 1, ...`` on a process pool."""
+    play = partial(simulate_game, policy1, policy2, max_turns=max_turns, board_factory=board_factory, record=record)
+    seeds = range(seed, seed + games)
+    start = time.perf_counter()
+    if processes == 1:
+        results = [play(game_seed) for game_seed in seeds]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            chunksize = max(1, games // ((processes or multiprocessing.cpu_count()) * 8))
+            results = pool.map(play, seeds, chunksize=chunksize)
+    return BatchReport(results, time.perf_counter() - start)
+
+
+POLICIES = {
+    "random": random_policy,
+    "stay": stay_policy,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run headless 7-stones self-play games.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--player-1", choices=POLICIES, default="random")
+    parser.add_argument("--player-2", choices=POLICIES, default="random")
+    parser.add_argument("--record", metavar="PATH", help="append the games to this archive")
+    args = parser.parse_args()
+    report = run_batch(POLICIES[args.player_1], POLICIES[args.player_2], args.games,
+                       seed=args.seed, processes=args.processes, max_turns=args.max_turns, record=bool(args.record))
+    if args.record:
+        with gamerecord.ArchiveWriter(args.record) as writer:
+            for result in report.results:
+                writer.write(result.record)
+    print(report.summary())
@@ -0,0 +1,73 @@
+"""Binary checkpoints of a whole game state.
+
+``serialize`` packs a board into a fixed layout: a header with the board
+size, setup zone and turn number, then one byte per cell for the terrain,
+one for the city owner and one per player for the number of units on the
+cell. A 9x9 board takes 342 bytes.
+
+``deserialize`` keeps one empty template board per map layout and restores
+a state as a snapshot of it with the units placed in bulk, so only the
+cells holding units are copied. Templates are frozen: a restored board
+copies a template cell before changing its terrain or city, like any
+snapshot, and writing to a template cell directly raises ValueError.
+"""
+import struct
+
+import numpy as np
+
+import grid
+
+MAGIC = b"7SS\x01"
+# Magic, height, width, zone, turn. The turn comes last so the rest of the
+# header can key the layout templates.
+_HEADER = struct.Struct("<4sIIHI")
+_templates = grid.TranspositionCache(maxsize=64)
+
+
+def serialize(board: grid.Board) -> bytes:
+    # Compare fields rather than classes: when grid runs as a script its
+    # units are ``__main__.Unit``.
+    for unit in board.unit_cells:
+        if (unit.player not in (1, 2) or unit.movement != grid.Unit.movement
+                or unit.control != grid.Unit.control or unit.vision != grid.Unit.vision):
+            raise ValueError("Only plain grid.Unit units can be serialized")
+    terrain, cities = board.layout_codes()
+    counts = np.zeros((2, len(board.cells)), dtype=np.uint8)
+    for player in (1, 2):
+        indices = [board.unit_cells[unit] for unit in board.player_units.get(player, ())]
+        np.add.at(counts[player - 1], indices, 1)
+    header = _HEADER.pack(MAGIC, board.height, board.width, board.zone, board.turn)
+    return b"".join([header, terrain.tobytes(), cities.tobytes(), counts.tobytes()])
+
+
+def deserialize(data: bytes) -> grid.Board:
+    magic, height, width, zone, turn = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a serialized game state")
+    size = height * width
+    if len(data) != _HEADER.size + 4 * size:
+        raise ValueError("Serialized game state has the wrong length")
+    layout = bytes(data[:_HEADER.size - 4]) + bytes(data[_HEADER.size:_HEADER.size + 2 * size])
+    template = _templates.get(layout)
+    if template is None:
+        template = _template(data, height, width, zone)
+        _templates.put(layout, template)
+    board = template.snapshot()
+    board.populate(np.frombuffer(data, dtype=np.uint8, count=2 * size, offset=_HEADER.size + 2 * size))
+    board.turn = turn
+    return board
+
+
+def _template(data: bytes, height: int, width: int, zone: int) -> grid.Board:
+    size = height * width
+    terrain = np.frombuffer(data, dtype=np.uint8, count=size, offset=_HEADER.size).tolist()
+    cities = np.frombuffer(data, dtype=np.uint8, count=size, offset=_HEADER.size + size).tolist()
+    cells = [grid.Cell() for _ in range(size)]
+    for cell, cell_terrain, city in zip(cells, terrain, cities):
+        if cell_terrain:
+            cell.type = cell_terrain
+        if city:
+            cell.city = city
+    template = grid.Board([cells[row * width:(row + 1) * width] for row in range(height)], zone=zone)
+    template.freeze()
+    return template
@@ -0,0 +1,63 @@
+import importlib.util
+import grid
+import ai
+
+def test_determinized_board_hides_unseen_opponent_units():
+    board = grid.create_standard_board()
+    grid.add_unit(board, grid.Unit(1), board[8][0])
+    seen = grid.Unit(2)
+    hidden = grid.Unit(2)
+    grid.add_unit(board, seen, board[7][0])
+    grid.add_unit(board, hidden, board[0][8])
+    view = ai.determinize(board, 1)
+    assert grid.get_unit_cell(view, seen) is not None
+    assert grid.get_unit_cell(view, hidden) is None
+    assert grid.get_unit_cell(board, hidden) is board[0][8]
+
+def test_determinized_board_hides_unseen_opponent_cities():
+    board = grid.create_standard_board()
+    board[0][0].city = 2
+    board[8][8].city = 1
+    grid.add_unit(board, grid.Unit(1), board[0][2])
+    view = ai.determinize(board, 1)
+    assert view[0][0].city is None
+    assert view[8][8].city == 1
+    assert board[0][0].city == 2
+
+def test_computer_takes_an_undefended_city():
+    class Scout(grid.Unit):
+        vision = 2
+    board = grid.create_standard_board()
+    board[0][0].city = 2
+    board[8][8].city = 1
+    grid.add_unit(board, Scout(1), board[0][2])
+    assert grid.get_cell_visibility(board, board[0][0], 1)
+    player = ai.MCTSPlayer(iterations=200, time_limit=None, seed=0)
+    moves = player.choose_moves(board, 1)
+    assert [(cell.row, cell.column) for unit, cell in moves] == [(0, 1)]
+    assert player.last_report.nodes > 0
+
+def test_parallel_search_returns_legal_moves():
+    board = grid.create_standard_board()
+    grid.place_starter_units(board)
+    player = ai.MCTSPlayer(iterations=20, time_limit=None, processes=2, seed=1)
+    try:
+        moves = player.choose_moves(board, 2)
+    finally:
+        player.close()
+    assert len(moves) == 7
+    assert all(grid.get_move_error(board, unit, cell) is None for unit, cell in moves)
+    assert sum(player.last_report.visits) == 40
+
+def test_parallel_search_takes_boards_from_grid_run_as_a_script():
+    spec = importlib.util.spec_from_file_location("script_grid", grid.__file__)
+    script_grid = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script_grid)
+    board = script_grid.create_standard_board()
+    script_grid.place_starter_units(board)
+    player = ai.MCTSPlayer(iterations=10, time_limit=None, processes=2, seed=1)
+    try:
+        moves = player.choose_moves(board, 1)
+    finally:
+        player.close()
+    assert len(moves) == 7
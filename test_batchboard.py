@@ -0,0 +1,86 @@
+import random
+import numpy as np
+import pytest
+import grid
+import batchboard
+
+def random_position(rng: random.Random) -> grid.Board:
+    board = grid.create_standard_board()
+    open_cells = [cell for cell in board.cells if cell.type in (grid.Terrain.PLAIN, grid.Terrain.FOREST)]
+    for player in (1, 2):
+        rng.choice(open_cells).city = player
+        for _ in range(rng.randint(0, grid.MAX_PLAYER_UNITS)):
+            grid.add_unit(board, grid.Unit(player), rng.choice(open_cells))
+    return board
+
+@pytest.fixture
+def boards():
+    rng = random.Random(7)
+    return [random_position(rng) for _ in range(40)]
+
+def test_round_trip_keeps_terrain_cities_and_units(boards):
+    batch = batchboard.from_boards(boards)
+    for game, board in enumerate(boards):
+        restored = batchboard.to_board(batch, game)
+        for cell, restored_cell in zip(board.cells, restored.cells):
+            assert restored_cell.type == cell.type
+            assert restored_cell.city == cell.city
+            assert sorted(unit.player for unit in restored_cell.units) == sorted(unit.player for unit in cell.units)
+
+def test_kernels_match_grid_rules(boards):
+    batch = batchboard.from_boards(boards)
+    signed, no_influence = batch.control()
+    has_freedom = batch.free()
+    winners = batch.winner()
+    for game, board in enumerate(boards):
+        for cell in board.cells:
+            control = grid.get_cell_control(board, cell)
+            assert no_influence[game, cell.row, cell.column] == (control is None)
+            if control is not None:
+                assert signed[game, cell.row, cell.column] == control
+            for player in (1, 2):
+                assert has_freedom[game, player - 1, cell.row, cell.column] == grid.check_for_freedom(board, cell, player)
+        assert winners[game] == (grid.check_for_winner(board) or 0)
+    rounds = batch.resolve()
+    for game, board in enumerate(boards):
+        assert rounds[game] == grid.resolve_units(board).rounds
+        assert (batch.units[game] == board.unit_control).all()
+
+def test_step_matches_apply_turn(boards):
+    batch = batchboard.from_boards(boards)
+    rng = np.random.default_rng(3)
+    for _ in range(5):
+        moves = batch.random_moves(rng)
+        playing = (batch.winners == 0).tolist()
+        for game, board in enumerate(boards):
+            if not playing[game]:
+                continue
+            player_moves = {1: [], 2: []}
+            moved = set()
+            for _, player, source, target in moves[moves[:, 0] == game].tolist():
+                unit = next(unit for unit in board.cells[source].units if unit.player == player and unit not in moved)
+                moved.add(unit)
+                player_moves[player].append((unit, board.cells[target]))
+            grid.apply_turn(board, player_moves[1], player_moves[2])
+            grid.resolve_units(board)
+        winners = batch.step(moves)
+        for game, board in enumerate(boards):
+            assert (batch.units[game] == board.unit_control).all()
+            if playing[game]:
+                assert winners[game] == (grid.check_for_winner(board) or 0)
+
+def test_step_rejects_illegal_moves_without_changing_anything(boards):
+    batch = batchboard.from_boards(boards)
+    units = batch.units.copy()
+    game, player, source = (int(value[0]) for value in np.nonzero(batch.units.reshape(len(boards), 2, -1)))
+    lake = next(cell.index for cell in boards[game].cells if cell.type == grid.Terrain.LAKE)
+    count = int(batch.units.reshape(len(boards), 2, -1)[game, player, source])
+    moves = [[game, player + 1, source, source]] * (count - 1) + [[game, player + 1, source, lake], [game, player + 1, source, source], [len(boards), 1, 0, 0]]
+    with pytest.raises(grid.InvalidTurnError) as error:
+        batch.step(moves)
+    reasons = [reason for _, _, reason in error.value.errors]
+    assert [number for _, number, _ in error.value.errors] == [count - 1, count, count + 1]
+    assert "lake" in reasons[0]
+    assert reasons[1:] == ["No unit left to move", "Move is not on the board"]
+    assert (batch.units == units).all()
+    assert not batch.turns.any()
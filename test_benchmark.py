@@ -0,0 +1,27 @@
+import benchmark
+
+def layout(board):
+    return [(cell.type, cell.city, sorted(unit.player for unit in cell.units)) for cell in board.cells]
+
+def test_generators_are_seeded():
+    assert layout(benchmark.generate_position(4, 11, 0.1)) == layout(benchmark.generate_position(4, 11, 0.1))
+    assert layout(benchmark.generate_position(4, 11, 0.1)) != layout(benchmark.generate_position(5, 11, 0.1))
+    capped = benchmark.generate_position(4, 11, 0.5, max_units=7)
+    assert capped.unit_count(1) == capped.unit_count(2) == 7
+    assert layout(benchmark.generate_cascade(0, 9, attempts=20)) == layout(benchmark.generate_cascade(0, 9, attempts=20))
+
+def test_suite_covers_every_hot_path():
+    report = benchmark.run_suite(sizes=[7], densities=[0.1], repeat=1, min_time=0, cascade_attempts=5)
+    names = {name.split("[")[0] for name in report["results"]}
+    assert names == {"get_cell_control", "get_contiguous_controlled_or_contested_cells", "check_for_freedom",
+                     "resolve_units", "resolve_units_cascade", "check_for_winner", "print_player_view",
+                     "simulated_turn"}
+    assert all(result["seconds_per_call"] > 0 for result in report["results"].values())
+
+def test_compare_flags_slowdowns_past_the_threshold():
+    before = {"results": {"a": {"seconds_per_call": 1.0}, "b": {"seconds_per_call": 1.0}, "gone": {"seconds_per_call": 1.0}}}
+    after = {"results": {"a": {"seconds_per_call": 1.05}, "b": {"seconds_per_call": 1.5}}}
+    rows = {row["name"]: row for row in benchmark.compare(before, after, threshold=0.1)}
+    assert set(rows) == {"a", "b"}
+    assert not rows["a"]["regression"]
+    assert rows["b"]["regression"]
@@ -0,0 +1,46 @@
+import pytest
+import grid
+import bitboard
+
+@pytest.fixture
+def board():
+    return grid.create_standard_board()
+
+def test_round_trip_keeps_terrain_cities_and_units(board):
+    board[7][1].city = 1
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(2), board[0][8])
+    restored = bitboard.to_board(bitboard.from_board(board))
+    for cell, restored_cell in zip(board.cells, restored.cells):
+        assert restored_cell.type == cell.type
+        assert restored_cell.city == cell.city
+        assert sorted(unit.player for unit in restored_cell.units) == sorted(unit.player for unit in cell.units)
+
+def test_control_grid_matches_cell_control(board):
+    board[3][3].city = 2
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    expected = [[grid.get_cell_control(board, cell) for cell in row] for row in board]
+    assert bitboard.from_board(board).control_grid() == expected
+
+def test_cascading_deaths_match_resolve_units(board):
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(1), board[6][4])
+    for row, column in [(5, 5), (5, 5), (7, 3), (7, 3), (6, 7), (6, 7)]:
+        grid.add_unit(board, grid.Unit(2), board[row][column])
+    engine = bitboard.from_board(board)
+    engine.resolve()
+    grid.resolve_units(board)
+    assert engine.occupied(1) == 0
+    assert engine.unit_count(5, 5, 2) == 2
+    assert bitboard.from_board(board).units == engine.units
+
+def test_winner_matches_check_for_winner(board):
+    board[6][6].city = 1
+    board[3][3].city = 2
+    grid.add_unit(board, grid.Unit(2), board[6][6])
+    assert bitboard.from_board(board).winner() == grid.check_for_winner(board) == 2
+    grid.add_unit(board, grid.Unit(1), board[3][3])
+    assert bitboard.from_board(board).winner() == grid.check_for_winner(board) == 3
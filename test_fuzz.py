@@ -0,0 +1,28 @@
+import fuzz
+
+def test_engines_agree_with_the_reference():
+    report = fuzz.run(games=6, turns=4, seed=11, batch=16)
+    assert report.positions > 6
+    assert set(report.seconds) == {"reference", "grid", "bitboard", "batchboard"}
+    assert report.mismatches == []
+
+def test_positions_are_seeded():
+    def layout(board):
+        return [(cell.type, cell.city, sorted(unit.player for unit in cell.units)) for cell in board.cells]
+    first = [(seed, turn, layout(board)) for seed, turn, board in fuzz.positions(2, 3, seed=5)]
+    second = [(seed, turn, layout(board)) for seed, turn, board in fuzz.positions(2, 3, seed=5)]
+    assert first == second
+    assert [turn for seed, turn, _ in first if seed == 5][:2] == [0, 1]
+
+def test_mismatches_name_the_engine_position_and_field(monkeypatch):
+    def broken(boards):
+        outcomes = fuzz.grid_outcomes(boards)
+        for outcome in outcomes:
+            outcome.winner = 3
+        return outcomes
+    monkeypatch.setitem(fuzz.ENGINES, "broken", broken)
+    report = fuzz.run(["broken"], games=2, turns=1, seed=3)
+    assert report.mismatches
+    assert {(mismatch.engine, mismatch.field, mismatch.actual) for mismatch in report.mismatches} == {("broken", "winner", 3)}
+    assert {mismatch.seed for mismatch in report.mismatches} <= {3, 4}
+    assert "mismatches" in report.summary()
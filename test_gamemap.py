@@ -0,0 +1,64 @@
+import pytest
+import gamemap
+import grid
+
+SMALL_MAP = """# a tiny test map
+name small
+zone 1
+2.B.
+.~^f
+A.1.
+"""
+
+def test_parse_map():
+    game_map = gamemap.parse_map(SMALL_MAP)
+    assert game_map.name == "small"
+    assert (game_map.height, game_map.width, game_map.zone) == (3, 4, 1)
+    assert game_map.terrain[5:8] == ["lake", "mountain", "forest"]
+    assert game_map.cities == {2: 2, 8: 1}
+    assert game_map.units == [(0, 2), (10, 1)]
+    assert game_map.neighbors[0] == (4, 1)
+    assert game_map.neighbors[5] == (1, 9, 4, 6)
+    assert game_map.mirror[0] == 11
+    assert gamemap.parse_map(game_map.dumps()).dumps() == game_map.dumps()
+
+@pytest.mark.parametrize("text", ["", "..\n...\n", "..\n.x\n", "zone 4\n..\n..\n", "..\nzone 1\n"])
+def test_parse_map_rejects_bad_maps(text):
+    with pytest.raises(ValueError):
+        gamemap.parse_map(text)
+
+def test_standard_map_matches_the_standard_board():
+    board = grid.create_standard_board()
+    assert (board.height, board.width, board.zone) == (9, 9, 3)
+    assert board.neighbors is gamemap.standard_map().neighbors
+    assert [cell.index for cell in board.cells if cell.type != grid.Terrain.PLAIN] == [20, 24, 40, 56, 60]
+    assert board[4][4].type == grid.Terrain.MOUNTAIN
+    assert board[2][6].type == grid.Terrain.LAKE
+    assert board[6][6].type == grid.Terrain.FOREST
+    grid.place_starter_units(board)
+    assert board[7][1].city == 1
+    assert board[1][7].city == 2
+    assert sorted(board.unit_cells[unit] for unit in board.player_units[1]) == list(range(72, 79))
+    assert sorted(board.unit_cells[unit] for unit in board.player_units[2]) == list(range(2, 9))
+
+def test_rectangular_board():
+    game_map = gamemap.parse_map(SMALL_MAP)
+    board = grid.create_board(game_map)
+    grid.place_map_start(board, game_map)
+    assert grid.mirror_position(board, 0, 1, 2) == (2, 2)
+    assert grid.mirror_position(board, 0, 1, 1) == (0, 1)
+    assert grid.validate_user_input_coordinates("2,3", board) == (2, 3)
+    assert grid.validate_user_input_coordinates("3,0", board) is None
+    assert grid.PlayerView(board, 2).cell(0, 0).cell is board[2][3]
+    assert grid.check_for_winner(board) is None
+
+def test_large_board():
+    size = 200
+    game_map = gamemap.GameMap("large", [["plain"] * size for _ in range(size)],
+                               cities={0: 1, size * size - 1: 2}, units=[(1, 1), (size * size - 2, 2)])
+    board = grid.create_board(game_map)
+    grid.place_map_start(board, game_map)
+    stats = grid.resolve_units(board)
+    assert stats.removed == 0
+    assert grid.check_for_winner(board) is None
+    assert board.reachable(1)[0] == (0, 1, size)
@@ -0,0 +1,58 @@
+import pytest
+import gamemap
+import gamerecord
+import grid
+import simulate
+
+def play(seed, max_turns=60):
+    return simulate.simulate_game(simulate.random_policy, simulate.random_policy, seed, max_turns=max_turns, record=True)
+
+def positions(board):
+    return [sorted(unit.player for unit in cell.units) for cell in board.cells]
+
+def test_replay_reaches_the_same_result():
+    for seed in range(5):
+        result = play(seed)
+        record = result.record
+        assert len(record.turns) == result.turns
+        assert record.winner == result.winner
+        *_, board = gamerecord.replay(record)
+        assert grid.check_for_winner(board) == result.winner
+
+def test_archive_round_trip_streaming_and_random_access(tmp_path):
+    path = str(tmp_path / "games.7sa")
+    games = [play(seed).record for seed in range(4)]
+    with gamerecord.ArchiveWriter(path) as writer:
+        for record in games[:2]:
+            writer.write(record)
+    with gamerecord.ArchiveWriter(path) as writer:
+        for record in games[2:]:
+            writer.write(record)
+    assert list(gamerecord.read_games(path)) == games
+    with gamerecord.Archive(path) as archive:
+        assert len(archive) == 4
+        assert archive[2] == games[2]
+        assert archive.turn(3, 1) == games[3].turns[1]
+        with pytest.raises(IndexError):
+            archive.turn(0, len(games[0].turns))
+    for (record, board), game in zip(gamerecord.replay_archive(path), games):
+        assert record == game
+        assert positions(board) == positions(list(gamerecord.replay(game))[-1])
+
+def test_wide_board_uses_four_byte_indices():
+    game_map = gamemap.GameMap("wide", [["plain"] * 300 for _ in range(300)], {0: 1, 89999: 2})
+    board = grid.create_board(game_map)
+    grid.place_map_start(board, game_map)
+    grid.add_unit(board, grid.Unit(1), board.cells[1])
+    grid.add_unit(board, grid.Unit(2), board.cells[89998])
+    recorder = gamerecord.GameRecorder(board)
+    recorder.record_turn(board, [(grid.get_player_units(board, 2)[0], board.cells[89997])])
+    record = recorder.finish(None)
+    assert gamerecord.decode(gamerecord.encode(record)) == record
+    assert gamerecord.encode(record)[4] == 4
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not an archive")
+    with pytest.raises(ValueError):
+        next(gamerecord.read_games(str(path)))
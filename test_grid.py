@@ -1,3 +1,4 @@
+import io
 import pytest
 import grid
 
@@ -7,11 +8,11 @@ def board():
 
 def test_unit_dies_when_cell_is_controlled_by_opponent(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_2_unit = grid.Unit(2)
     player_2_unit_2 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit, 6, 6)
-    grid.add_unit(board, player_2_unit_2, 6, 6)
+    grid.add_unit(board, player_2_unit, board[6][6])
+    grid.add_unit(board, player_2_unit_2, board[6][6])
     grid.resolve_units(board)
     grid.print_board(board)
     cell = board[6][6]
@@ -20,7 +21,7 @@ def test_unit_dies_when_cell_is_controlled_by_opponent(board):
 
 def test_get_contiguous_controlled_cells_returns_appropriate_cells_for_one_unit(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     contiguous_cells = grid.get_contiguous_controlled_or_contested_cells(board, board[6][6], 1)
     expected_contiguous_cells = set(grid.get_adjacent_cells(board, board[6][6]))
     expected_contiguous_cells.add(board[6][6])
@@ -30,9 +31,9 @@ def test_get_contiguous_controlled_cells_returns_appropriate_cells_for_one_unit(
 
 def test_get_contiguous_controlled_cells_returns_appropriate_cells_for_two_units(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_1_unit_2 = grid.Unit(1)
-    grid.add_unit(board, player_1_unit_2, 6, 7)
+    grid.add_unit(board, player_1_unit_2, board[6][7])
     contiguous_cells = grid.get_contiguous_controlled_or_contested_cells(board, board[6][6], 1)
     expected_contiguous_cells = set(grid.get_adjacent_cells(board, board[6][6]))
     expected_contiguous_cells.update(set(grid.get_adjacent_cells(board, board[6][7])))
@@ -46,15 +47,15 @@ def test_get_contiguous_controlled_cells_for_no_unit(board):
 
 def test_get_contiguous_controlled_cells_returns_appropriate_cells_for_neutral_square(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_2_unit = grid.Unit(2)
-    grid.add_unit(board, player_2_unit, 5, 6)
+    grid.add_unit(board, player_2_unit, board[5][6])
     player_2_unit_2 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_2, 7, 4)
+    grid.add_unit(board, player_2_unit_2, board[7][4])
     player_2_unit_3 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_3, 8, 7)
+    grid.add_unit(board, player_2_unit_3, board[8][7])
     player_2_unit_4 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_4, 5, 8)
+    grid.add_unit(board, player_2_unit_4, board[5][8])
     grid.print_board(board)
     contiguous_cells = grid.get_contiguous_controlled_or_contested_cells(board, board[6][6], 1)
     print(contiguous_cells)
@@ -69,15 +70,15 @@ def test_get_contiguous_controlled_cells_returns_appropriate_cells_for_neutral_s
 
 def test_unit_dies_when_surrounding_cells_are_controlled_by_opponent(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_2_unit = grid.Unit(2)
-    grid.add_unit(board, player_2_unit, 7, 7)
+    grid.add_unit(board, player_2_unit, board[7][7])
     player_2_unit_2 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_2, 7, 7)
+    grid.add_unit(board, player_2_unit_2, board[7][7])
     player_2_unit_3 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_3, 5, 5)
+    grid.add_unit(board, player_2_unit_3, board[5][5])
     player_2_unit_4 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_4, 5, 5)
+    grid.add_unit(board, player_2_unit_4, board[5][5])
     cell = board[6][6]
     assert grid.check_player_controls_cell(board, cell, 1)
     adjacent_cells = grid.get_adjacent_cells(board, cell)
@@ -88,19 +89,19 @@ def test_unit_dies_when_surrounding_cells_are_controlled_by_opponent(board):
 
 def test_simultaneous_deaths(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_1_unit_2 = grid.Unit(1)
-    grid.add_unit(board, player_1_unit_2, 6, 6)
+    grid.add_unit(board, player_1_unit_2, board[6][6])
     player_2_unit_0 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_0, 6, 6)
+    grid.add_unit(board, player_2_unit_0, board[6][6])
     player_2_unit = grid.Unit(2)
-    grid.add_unit(board, player_2_unit, 7, 7)
+    grid.add_unit(board, player_2_unit, board[7][7])
     player_2_unit_2 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_2, 7, 7)
+    grid.add_unit(board, player_2_unit_2, board[7][7])
     player_2_unit_3 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_3, 5, 5)
+    grid.add_unit(board, player_2_unit_3, board[5][5])
     player_2_unit_4 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_4, 5, 5)
+    grid.add_unit(board, player_2_unit_4, board[5][5])
     grid.resolve_units(board)
     cell = board[6][6]
     assert player_1_unit not in cell.units
@@ -109,15 +110,15 @@ def test_simultaneous_deaths(board):
 
 def test_unit_dies_when_surrounded_even_if_unit_square_is_neutral(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_2_unit = grid.Unit(2)
-    grid.add_unit(board, player_2_unit, 5, 6)
+    grid.add_unit(board, player_2_unit, board[5][6])
     player_2_unit_2 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_2, 7, 4)
+    grid.add_unit(board, player_2_unit_2, board[7][4])
     player_2_unit_3 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_3, 8, 7)
+    grid.add_unit(board, player_2_unit_3, board[8][7])
     player_2_unit_4 = grid.Unit(2)
-    grid.add_unit(board, player_2_unit_4, 5, 8)
+    grid.add_unit(board, player_2_unit_4, board[5][8])
     grid.resolve_units(board)
     cell = board[6][6]
     assert player_1_unit not in cell.units
@@ -125,40 +126,40 @@ def test_unit_dies_when_surrounded_even_if_unit_square_is_neutral(board):
 # one unit's death triggers the death of another unit
 def test_cascading_deaths(board):
     player_1_unit = grid.Unit(1)
-    grid.add_unit(board, player_1_unit, 6, 6)
+    grid.add_unit(board, player_1_unit, board[6][6])
     player_1_unit_2 = grid.Unit(1)
-    grid.add_unit(board, player_1_unit_2, 6, 4)
-    grid.add_unit(board, grid.Unit(2), 5, 5)
-    grid.add_unit(board, grid.Unit(2), 5, 5)
-    grid.add_unit(board, grid.Unit(2), 7, 3)
-    grid.add_unit(board, grid.Unit(2), 7, 3)
+    grid.add_unit(board, player_1_unit_2, board[6][4])
+    grid.add_unit(board, grid.Unit(2), board[5][5])
+    grid.add_unit(board, grid.Unit(2), board[5][5])
+    grid.add_unit(board, grid.Unit(2), board[7][3])
+    grid.add_unit(board, grid.Unit(2), board[7][3])
     grid.print_board(board)
     grid.resolve_units(board)
     assert player_1_unit in board[6][6].units
     assert player_1_unit_2 in board[6][4].units
-    grid.add_unit(board, grid.Unit(2), 6, 7)
-    grid.add_unit(board, grid.Unit(2), 6, 7)
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
     grid.resolve_units(board)
     assert player_1_unit not in board[6][6].units
     assert player_1_unit_2 not in board[6][4].units
 
 def test_player_2_win(board):
     board[6][6].city = 1
-    grid.add_unit(board, grid.Unit(2), 6, 7)
+    grid.add_unit(board, grid.Unit(2), board[6][7])
     winner = grid.check_for_winner(board)
     assert winner == 2
 
 def test_player_1_win(board):
     board[6][6].city = 2
-    grid.add_unit(board, grid.Unit(1), 6, 6)
+    grid.add_unit(board, grid.Unit(1), board[6][6])
     winner = grid.check_for_winner(board)
     assert winner == 1
 
 def test_draw(board):
     board[6][6].city = 1
-    grid.add_unit(board, grid.Unit(2), 6, 6)
+    grid.add_unit(board, grid.Unit(2), board[6][6])
     board[3][3].city = 2
-    grid.add_unit(board, grid.Unit(1), 3, 3)
+    grid.add_unit(board, grid.Unit(1), board[3][3])
     winner = grid.check_for_winner(board)
     assert winner == 3
 
@@ -170,3 +171,407 @@ def test_uncontrolled_city_does_not_end_game(board):
     board[6][6].city = 1
     winner = grid.check_for_winner(board)
     assert winner is None
+
+def test_cells_know_their_position(board):
+    cell = board[3][5]
+    assert (cell.row, cell.column) == (3, 5)
+    assert grid.get_cell_position(board, cell) == (3, 5)
+    assert board.cell(3, 5) is cell
+
+def test_adjacent_cells_on_edges_and_corners(board):
+    assert grid.get_adjacent_cells(board, board[0][0]) == {board[0][1], board[1][0]}
+    assert grid.get_adjacent_cells(board, board[8][4]) == {board[7][4], board[8][3], board[8][5]}
+    assert len(grid.get_adjacent_cells(board, board[4][4])) == 4
+
+def test_cell_from_another_board_is_not_found(board):
+    with pytest.raises(ValueError):
+        grid.get_cell_position(board, grid.Cell())
+
+def test_unit_registry_follows_moves_and_removals(board):
+    unit = grid.Unit(1)
+    grid.add_unit(board, unit, board[6][6])
+    assert grid.get_unit_cell(board, unit) is board[6][6]
+    grid.move_unit(board, unit, board[6][7])
+    assert grid.get_unit_position(board, unit) == (6, 7)
+    assert unit not in board[6][6].units
+    grid.remove_unit(board, unit)
+    assert grid.get_unit_cell(board, unit) is None
+    assert grid.get_player_units(board, 1) == []
+
+def test_player_cannot_have_more_than_seven_units(board):
+    for column in range(7):
+        grid.add_unit(board, grid.Unit(1), board[8][column])
+    with pytest.raises(ValueError):
+        grid.add_unit(board, grid.Unit(1), board[8][7])
+    grid.add_unit(board, grid.Unit(2), board[8][7])
+    assert len(grid.get_player_units(board, 1)) == 7
+
+def test_control_map_matches_cell_control(board):
+    board[7][1].city = 1
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(1), board[0][0])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    control, no_influence = grid.compute_control_map(board)
+    for cell in board.cells:
+        control_value = grid.get_cell_control(board, cell)
+        assert no_influence[cell.row, cell.column] == (control_value is None)
+        if control_value is not None:
+            assert control[cell.row, cell.column] == control_value
+    assert control[6, 6] == -1
+    assert control[0, 1] == 1
+    assert not no_influence[7, 1]
+
+def test_incremental_control_map_stays_in_sync(board, monkeypatch):
+    monkeypatch.setattr(grid.Board, "debug", True)
+    player_1_unit = grid.Unit(1)
+    grid.add_unit(board, player_1_unit, board[6][6])
+    grid.add_unit(board, grid.Unit(1), board[6][4])
+    grid.add_unit(board, grid.Unit(2), board[5][5])
+    grid.add_unit(board, grid.Unit(2), board[7][3])
+    grid.move_unit(board, player_1_unit, board[6][5])
+    grid.add_unit(board, grid.Unit(2), board[7][5])
+    grid.resolve_units(board)
+    grid.check_control_map(board)
+
+def test_control_map_check_detects_drift(board):
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    board.influence[0, 6, 6] += 1
+    with pytest.raises(AssertionError):
+        grid.check_control_map(board)
+
+def test_regions_share_a_label_and_freedom(board):
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(1), board[6][7])
+    grid.add_unit(board, grid.Unit(1), board[1][1])
+    regions = grid.label_regions(board, 1)
+    assert regions.labels[board[6][6].index] == regions.labels[board[6][7].index]
+    assert regions.labels[board[6][6].index] != regions.labels[board[1][1].index]
+    assert regions.labels[board[3][3].index] == -1
+    assert regions.is_free(board[6][6])
+    assert not regions.is_free(board[3][3])
+
+def test_resolution_reports_rounds_and_evaluations(board):
+    player_1_unit = grid.Unit(1)
+    grid.add_unit(board, player_1_unit, board[6][6])
+    grid.add_unit(board, grid.Unit(1), board[0][0])
+    grid.add_unit(board, grid.Unit(2), board[7][7])
+    grid.add_unit(board, grid.Unit(2), board[7][7])
+    grid.add_unit(board, grid.Unit(2), board[5][5])
+    grid.add_unit(board, grid.Unit(2), board[5][5])
+    stats = grid.resolve_units(board)
+    assert player_1_unit not in board[6][6].units
+    assert stats.removed == 1
+    assert stats.rounds == 2
+    # 4 occupied cells in the first round, then only the two player 2 stacks
+    # next to the removed unit; the unit in the far corner is not re-checked
+    assert stats.evaluations == 6
+
+def test_player_view_mirrors_without_touching_the_board(board):
+    board[7][1].city = 1
+    unit = grid.Unit(1)
+    grid.add_unit(board, unit, board[8][0])
+    view = grid.PlayerView(board, 2)
+    mirrored = view.cell(0, 8)
+    assert mirrored.cell is board[8][0]
+    assert mirrored.players == [2]
+    assert view.cell(1, 7).city == 2
+    assert mirrored.control == -grid.get_cell_control(board, board[8][0])
+    assert not view.cell(8, 8).visible
+    assert unit.player == 1
+    assert board[7][1].city == 1
+
+def test_snapshot_shares_unchanged_cells(board):
+    unit = grid.Unit(1)
+    grid.add_unit(board, unit, board[6][6])
+    snapshot = board.snapshot()
+    grid.move_unit(board, unit, board[6][7])
+    assert [unit.player for unit in snapshot[6][6].units] == [1]
+    assert snapshot[6][7].units == []
+    assert grid.get_unit_position(snapshot, unit) == (6, 6)
+    assert grid.get_cell_control(snapshot, snapshot[6][8]) is None
+    assert snapshot.cells[0] is board.cells[0]
+    assert snapshot.cells[board[6][6].index] is not board.cells[board[6][6].index]
+
+def test_restore_rolls_back_to_snapshot(board):
+    unit = grid.Unit(1)
+    grid.add_unit(board, unit, board[6][6])
+    snapshot = board.snapshot()
+    grid.add_unit(board, grid.Unit(2), board[6][6])
+    grid.add_unit(board, grid.Unit(2), board[6][6])
+    grid.resolve_units(board)
+    assert grid.get_unit_cell(board, unit) is None
+    board.restore(snapshot)
+    assert grid.get_unit_position(board, unit) == (6, 6)
+    assert grid.get_player_units(board, 2) == []
+    grid.check_control_map(board)
+    grid.remove_unit(board, unit)
+    assert grid.get_unit_position(snapshot, unit) == (6, 6)
+
+def test_cells_held_before_a_snapshot_stay_live(board):
+    cell = board[6][6]
+    snapshot = board.snapshot()
+    grid.add_unit(board, grid.Unit(1), cell)
+    cell.city = 1
+    assert board.contains(cell)
+    assert [unit.player for unit in board[6][6].units] == [1]
+    assert cell.index in board.city_indices(1)
+    assert snapshot[6][6].units == []
+    assert cell.index not in snapshot.city_indices(1)
+
+def test_layout_written_on_a_snapshot_stays_on_it(board):
+    snapshot = board.snapshot()
+    snapshot[6][6].city = 2
+    snapshot.cell(6, 7).type = "lake"
+    assert board[6][6].city is None
+    assert board[6][7].type == grid.Terrain.PLAIN
+    assert snapshot[6][6].city == 2
+    assert board.zobrist_hash() != snapshot.zobrist_hash()
+    board.restore(snapshot)
+    board[6][6].city = None
+    assert snapshot[6][6].city == 2
+
+def test_contains_rejects_cells_of_other_boards(board):
+    snapshot = board.snapshot()
+    assert board.contains(board[6][6])
+    assert not board.contains(snapshot[6][6])
+    with pytest.raises(ValueError):
+        grid.get_adjacent_cells(board, snapshot[6][6])
+
+def test_zobrist_hash_depends_on_position_not_history(board):
+    empty_hash = board.zobrist_hash()
+    unit = grid.Unit(1)
+    grid.add_unit(board, unit, board[6][6])
+    grid.add_unit(board, grid.Unit(2), board[5][5])
+    other = grid.create_standard_board()
+    grid.add_unit(other, grid.Unit(2), other[5][4])
+    grid.add_unit(other, grid.Unit(1), other[6][6])
+    grid.move_unit(other, grid.get_player_units(other, 2)[0], other[5][5])
+    assert board.zobrist_hash() == other.zobrist_hash()
+    board[7][1].city = 1
+    assert board.zobrist_hash() != other.zobrist_hash()
+    board[7][1].city = None
+    grid.remove_unit(board, unit)
+    grid.remove_unit(board, grid.get_player_units(board, 2)[0])
+    assert board.zobrist_hash() == empty_hash
+
+def test_zobrist_hash_depends_on_board_size():
+    wide = grid.Board([[grid.Cell() for _ in range(6)] for _ in range(3)])
+    tall = grid.Board([[grid.Cell() for _ in range(3)] for _ in range(6)])
+    small = grid.Board([[grid.Cell() for _ in range(3)] for _ in range(3)])
+    assert len({wide.zobrist_hash(), tall.zobrist_hash(), small.zobrist_hash()}) == 3
+
+def test_transposition_cache_replays_resolution_and_winner(board):
+    cache = grid.TranspositionCache()
+    board[6][6].city = 1
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    grid.add_unit(board, grid.Unit(2), board[6][7])
+    snapshot = board.snapshot()
+    first = grid.resolve_units(board, cache)
+    assert not first.cached and first.removed == 1
+    assert grid.check_for_winner(board, cache) == 2
+    board.restore(snapshot)
+    second = grid.resolve_units(board, cache)
+    assert second.cached and second.removed == 1
+    assert grid.get_player_units(board, 1) == []
+    assert grid.check_for_winner(board, cache) == 2
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_transposition_cache_is_bounded():
+    cache = grid.TranspositionCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+
+def test_legal_moves_match_move_validation(board):
+    grid.place_starter_units(board)
+    grid.remove_unit(board, grid.get_player_units(board, 2)[0])
+    grid.add_unit(board, grid.Unit(2), board[5][2])
+    units, moves = grid.generate_legal_moves(board, 2)
+    generated = {(units[slot], target) for slot, target in moves.tolist()}
+    expected = {(unit, cell.index) for unit in units for cell in board.cells
+                if grid.get_move_error(board, unit, cell) is None}
+    assert generated == expected
+    next_to_lake = grid.get_unit_cell(board, units[-1])
+    assert next_to_lake is board[5][2]
+    assert board[6][2].index not in {target for unit, target in generated if unit is units[-1]}
+
+def test_joint_moves_skip_reorderings_of_stacked_units(board):
+    for _ in range(2):
+        grid.add_unit(board, grid.Unit(1), board[5][5])
+    grid.add_unit(board, grid.Unit(1), board[0][0])
+    units, joint_moves = grid.generate_joint_moves(board, 1)
+    joint_moves = list(joint_moves)
+    # 5 targets for two interchangeable units give 15 pairs, times 3 targets in the corner
+    assert len(joint_moves) == 15 * 3
+    assert len(set(frozenset(enumerate(move)) for move in joint_moves)) == len(joint_moves)
+    assert (board[0][0].index, board[5][5].index, board[5][5].index) in joint_moves
+    moves = grid.expand_joint_move(board, units, joint_moves[0])
+    assert all(grid.get_move_error(board, unit, cell) is None for unit, cell in moves)
+
+def test_cells_and_units_are_compact_with_integer_ids(board):
+    unit = grid.Unit(1)
+    other = grid.Unit(1)
+    assert not hasattr(unit, "__dict__") and not hasattr(board[0][0], "__dict__")
+    assert isinstance(unit.id, int) and unit.id != other.id
+    assert unit != other and len({unit, other, unit}) == 2
+    clone = board[0][0].clone()
+    assert clone == board[0][0] and hash(clone) == hash(board[0][0])
+    assert board[4][4].type == grid.Terrain.MOUNTAIN
+    board[0][0].type = "forest"
+    assert board[0][0].type is grid.Terrain.FOREST
+
+def test_renderer_only_redraws_changed_cells(board):
+    grid.place_starter_units(board)
+    stream = io.StringIO()
+    renderer = grid.Renderer(stream, terminal_size=(200, 100))
+    renderer.draw(grid.PlayerView(board, 1))
+    frame = stream.getvalue()
+    assert frame.startswith(grid.CLEAR_SCREEN)
+    assert frame[len(grid.CLEAR_SCREEN):] == grid.compose_frame(grid.render_cells(grid.PlayerView(board, 1)))
+    stream.seek(0)
+    stream.truncate()
+    renderer.draw(grid.PlayerView(board, 1))
+    assert stream.getvalue() == "\x1b[38;1H\x1b[J"
+    stream.seek(0)
+    stream.truncate()
+    grid.move_unit(board, grid.get_player_units(board, 1)[0], board[7][0])
+    renderer.draw(grid.PlayerView(board, 1))
+    update = stream.getvalue()
+    # The unit's old and new cells plus the cells whose control changed
+    assert 0 < update.count("H") - 1 <= 3 * 5
+    assert "\x1b[30;2H(1) 1" in update
+    assert grid.CLEAR_SCREEN not in update
+    stream.seek(0)
+    stream.truncate()
+    renderer.draw(grid.PlayerView(board, 2))
+    assert stream.getvalue().startswith(grid.CLEAR_SCREEN)
+
+def test_visibility_map_follows_the_forest_rule_and_is_cached(board):
+    board[7][1].city = 1
+    unit = grid.Unit(1)
+    grid.add_unit(board, unit, board[2][1])
+    visible = grid.compute_visibility_map(board, 1)
+    assert visible[7, 1] and visible[2, 1] and visible[1, 1] and visible[2, 0]
+    assert not visible[2, 2]
+    assert visible.sum() == 5
+    assert [[grid.get_cell_visibility(board, cell, 1) for cell in row] for row in board] == visible.tolist()
+    grid.add_unit(board, grid.Unit(2), board[2][2])
+    assert grid.compute_visibility_map(board, 1) is visible
+    grid.move_unit(board, unit, board[2][2])
+    moved = grid.compute_visibility_map(board, 1)
+    assert moved is not visible and moved[2, 2] and not visible[2, 2]
+
+def test_visibility_map_uses_unit_vision(board):
+    class Scout(grid.Unit):
+        vision = 2
+    grid.add_unit(board, Scout(2), board[0][0])
+    visible = grid.compute_visibility_map(board, 2)
+    assert visible[2, 0] and visible[1, 1] and visible[0, 2]
+    assert not visible[2, 1] and not visible[2, 2]
+    snapshot = board.snapshot()
+    grid.remove_unit(snapshot, grid.get_player_units(snapshot, 2)[0])
+    assert not grid.compute_visibility_map(snapshot, 2).any()
+    assert grid.compute_visibility_map(board, 2) is visible
+
+def test_apply_turn_matches_moving_units_one_by_one(board):
+    grid.place_starter_units(board)
+    sequential = board.snapshot()
+    player_1_units = grid.get_player_units(board, 1)
+    player_2_units = grid.get_player_units(board, 2)
+    player_1_moves = [(unit, board.cells[board.reachable(1)[board.unit_cells[unit]][-1]]) for unit in player_1_units]
+    player_2_moves = [(unit, board.cells[board.reachable(1)[board.unit_cells[unit]][0]]) for unit in player_2_units]
+    for unit, target_cell in player_1_moves + player_2_moves:
+        grid.move_unit(sequential, unit, sequential.cells[target_cell.index])
+    grid.apply_turn(board, player_1_moves, player_2_moves)
+    assert board.unit_cells == sequential.unit_cells
+    assert (board.unit_control == sequential.unit_control).all()
+    assert (board.influence == sequential.influence).all()
+    assert board.zobrist == sequential.zobrist
+    assert [len(cell.units) for cell in board.cells] == [len(cell.units) for cell in sequential.cells]
+
+def test_apply_turn_rejects_the_whole_turn_with_reasons(board):
+    grid.place_starter_units(board)
+    before = board.snapshot()
+    player_1_unit = grid.get_player_units(board, 1)[0]
+    player_2_unit = grid.get_player_units(board, 2)[0]
+    lake = next(cell for cell in board.cells if cell.type == grid.Terrain.LAKE)
+    open_cell = board.cells[board.reachable(1)[board.unit_cells[player_1_unit]][-1]]
+    with pytest.raises(grid.InvalidTurnError) as error:
+        grid.apply_turn(board, [(player_1_unit, open_cell), (player_1_unit, open_cell), (player_2_unit, open_cell)],
+                        [(grid.get_player_units(board, 2)[1], lake)])
+    assert [(player, number) for player, number, _ in error.value.errors] == [(1, 1), (1, 2), (2, 0)]
+    assert error.value.errors[1][2] == "Unit belongs to player 2"
+    assert "more than once" in error.value.errors[0][2]
+    assert "lake" in error.value.errors[2][2]
+    assert board.unit_cells == before.unit_cells
+    assert board.zobrist == before.zobrist
+    assert (board.influence == before.influence).all()
+
+def test_winner_check_reuses_city_regions_until_they_change(board):
+    board[8][0].city = 1
+    board[0][8].city = 2
+    assert board.city_indices() == (board[0][8].index, board[8][0].index)
+    assert board.city_indices(1) == (board[8][0].index,)
+    far = grid.Unit(2)
+    grid.add_unit(board, far, board[4][6])
+    grid.add_unit(board, grid.Unit(2), board[6][1])
+    assert grid.check_for_winner(board) is None
+    region = board._city_regions[board[8][0].index][2]
+    grid.move_unit(board, far, board[4][7])
+    assert grid.check_for_winner(board) is None
+    assert board._city_regions[board[8][0].index][2] is region
+    grid.add_unit(board, grid.Unit(2), board[7][1])
+    assert grid.check_for_winner(board) == 2
+
+def test_city_threats_lists_move_sets_taking_every_liberty(board):
+    board[8][0].city = 1
+    near = grid.Unit(2)
+    corner = grid.Unit(2)
+    grid.add_unit(board, near, board[6][1])
+    grid.add_unit(board, corner, board[8][3])
+    threats = grid.city_threats(board, 1)
+    assert [city for city, _ in threats] == [board[8][0], board[8][0]]
+    assert [{(unit, cell.index) for unit, cell in moves} for _, moves in threats] == [
+        {(near, board[7][1].index)},
+        {(near, board[6][0].index), (corner, board[8][2].index)},
+    ]
+    assert grid.city_threats(board, 2) == []
+    for _, moves in threats:
+        trial = board.snapshot()
+        grid.apply_turn(trial, [], moves)
+        grid.resolve_units(trial)
+        assert grid.check_for_winner(trial) == 2
+
+def test_city_threats_list_move_sets_taking_the_city_cell(board):
+    board[8][0].city = 1
+    unit = grid.Unit(2)
+    grid.add_unit(board, unit, board[6][0])
+    threats = grid.city_threats(board, 1)
+    assert [(city, [(moved, cell.index) for moved, cell in moves]) for city, moves in threats] == [
+        (board[8][0], [(unit, board[7][0].index)]),
+    ]
+    grid.apply_turn(board, [], threats[0][1])
+    grid.resolve_units(board)
+    assert grid.check_for_winner(board) == 2
+
+def test_layout_caches_only_follow_their_own_board(board):
+    board[7][1].city = 1
+    grid.add_unit(board, grid.Unit(1), board[2][1])
+    visible = grid.compute_visibility_map(board, 1)
+    mask = board.city_mask()
+    key = board.zobrist_hash()
+    other = grid.create_standard_board()
+    other[3][3].city = 2
+    other[4][4].type = grid.Terrain.FOREST
+    assert grid.compute_visibility_map(board, 1) is visible
+    assert board.city_mask() is mask
+    assert board.zobrist_hash() == key
+    board[3][3].city = 2
+    assert grid.compute_visibility_map(board, 1) is not visible
+    assert board.city_mask() is not mask and board.city_mask()[3, 3]
@@ -0,0 +1,43 @@
+import json
+import time
+import pytest
+import grid
+import instrument
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = instrument.enable(str(tmp_path / "turns.jsonl"))
+    yield profiler
+    instrument.disable()
+
+def test_disabled_instrumentation_leaves_grid_untouched():
+    original = grid.resolve_units
+    instrument.enable()
+    assert grid.resolve_units is not original
+    instrument.disable()
+    assert grid.resolve_units is original
+    assert instrument.phase("input") is instrument.phase("render")
+    assert instrument.end_turn() is None
+
+def test_calls_are_counted_per_primitive(profiler):
+    board = grid.create_standard_board()
+    grid.add_unit(board, grid.Unit(1), board[6][6])
+    grid.resolve_units(board)
+    grid.check_for_winner(board)
+    summary = profiler.summary()
+    assert summary["calls"]["resolve_units"]["count"] == 1
+    assert summary["calls"]["label_regions"]["count"] >= 2
+    assert summary["calls"]["check_for_winner"]["seconds"] >= 0
+
+def test_phase_times_are_exclusive_and_logged(profiler):
+    with instrument.phase("input"):
+        time.sleep(0.02)
+        with instrument.phase("render"):
+            time.sleep(0.05)
+    summary = instrument.end_turn()
+    assert summary["phases"]["render"] >= 0.05
+    assert summary["phases"]["input"] < 0.05
+    with open(profiler.path) as log:
+        logged = [json.loads(line) for line in log]
+    assert logged == [summary]
+    assert profiler.phases == {}
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import loadtest
+import server
+
+class Client():
+    async def connect(self, port):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port, limit=server.LINE_LIMIT)
+        return self
+
+    def send(self, message):
+        self.writer.write(json.dumps(message).encode() + b"\n")
+
+    async def receive(self):
+        return json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+
+async def start_match(**settings):
+    game_server = server.GameServer(**settings)
+    await game_server.start("127.0.0.1", 0)
+    clients = [await Client().connect(game_server.port) for _ in range(2)]
+    for client in clients:
+        client.send({"type": "join"})
+        await asyncio.sleep(0.01)
+    return game_server, clients
+
+def own_units(view):
+    return [(row, column) for row, cells in enumerate(view["cells"]) for column, cell in enumerate(cells)
+            if len(cell) > 1 and 1 in cell[2]]
+
+def test_players_get_mirrored_views_and_turns_resolve():
+    async def play():
+        game_server, clients = await start_match()
+        starts = [await client.receive() for client in clients]
+        assert [start["player"] for start in starts] == [1, 2]
+        turns = [await client.receive() for client in clients]
+        for turn in turns:
+            assert turn["type"] == "turn" and turn["turn"] == 0
+            # Both players see their own units on their bottom row and their city as 1.
+            assert own_units(turn["view"]) == [(8, column) for column in range(7)]
+            assert turn["view"]["cells"][7][1][1] == 1
+            assert len(turn["view"]["cells"][0][0]) == 1
+        clients[0].send({"type": "moves", "turn": 0, "moves": [[8, 0, 7, 0]]})
+        clients[1].send({"type": "moves", "turn": 0, "moves": [[8, 0, 9, 0]]})
+        error = await clients[1].receive()
+        assert error["type"] == "error"
+        clients[1].send({"type": "moves", "turn": 0, "moves": []})
+        turns = [await client.receive() for client in clients]
+        assert [turn["turn"] for turn in turns] == [1, 1]
+        assert (7, 0) in own_units(turns[0]["view"]) and (8, 0) not in own_units(turns[0]["view"])
+        await game_server.stop()
+    asyncio.run(play())
+
+def test_turn_deadline_and_forfeit():
+    async def play():
+        game_server, clients = await start_match(turn_timeout=0.1)
+        for client in clients:
+            await client.receive()
+            await client.receive()
+        clients[0].send({"type": "moves", "turn": 0, "moves": []})
+        assert (await clients[0].receive())["turn"] == 1
+        assert (await clients[1].receive())["turn"] == 1
+        clients[1].writer.close()
+        end = await clients[0].receive()
+        assert end == {**end, "type": "end", "winner": 1}
+        await game_server.stop()
+        assert game_server.matches_played == 1
+    asyncio.run(play())
+
+def test_load_test_finishes_its_matches():
+    report = asyncio.run(loadtest.run_load_test(bots=4, matches=2, max_turns=5))
+    assert report.matches >= 4
+    assert report.latencies and report.matches_per_second > 0
@@ -0,0 +1,20 @@
+import simulate
+
+def test_same_seed_plays_the_same_game():
+    first = simulate.simulate_game(simulate.random_policy, simulate.random_policy, seed=3)
+    second = simulate.simulate_game(simulate.random_policy, simulate.random_policy, seed=3)
+    assert (first.winner, first.turns) == (second.winner, second.turns)
+
+def test_game_without_moves_hits_the_turn_limit():
+    result = simulate.simulate_game(simulate.stay_policy, simulate.stay_policy, seed=0, max_turns=5)
+    assert result.winner is None
+    assert result.turns == 5
+
+def test_batch_report_counts_every_game():
+    report = simulate.run_batch(simulate.random_policy, simulate.random_policy, games=6, processes=2, max_turns=30)
+    assert report.games == 6
+    assert sum(report.outcomes.values()) == 6
+    assert [result.seed for result in report.results] == list(range(6))
+    assert report.games_per_second > 0
+    serial = simulate.run_batch(simulate.random_policy, simulate.random_policy, games=6, processes=1, max_turns=30)
+    assert [result.winner for result in serial.results] == [result.winner for result in report.results]
@@ -0,0 +1,60 @@
+import pytest
+import grid
+import state
+
+@pytest.fixture
+def board():
+    board = grid.create_standard_board()
+    grid.place_starter_units(board)
+    return board
+
+def positions(board):
+    return [(cell.type, cell.city, sorted(unit.player for unit in cell.units)) for cell in board.cells]
+
+def test_round_trip_restores_the_whole_state(board):
+    grid.move_unit(board, grid.get_player_units(board, 2)[0], board[1][2])
+    grid.remove_unit(board, grid.get_player_units(board, 1)[1])
+    grid.add_unit(board, grid.Unit(1), board[8][0])
+    board.turn = 12
+    data = state.serialize(board)
+    assert len(data) == 18 + 4 * 81
+    restored = state.deserialize(data)
+    assert positions(restored) == positions(board)
+    assert restored.turn == 12
+    assert restored.zobrist_hash() == board.zobrist_hash()
+    assert (restored.influence == board.influence).all()
+    grid.check_control_map(restored)
+    assert state.serialize(restored) == data
+
+def test_restored_boards_are_independent(board):
+    data = state.serialize(board)
+    first = state.deserialize(data)
+    second = state.deserialize(data)
+    grid.move_unit(first, grid.get_player_units(first, 1)[0], first[7][0])
+    grid.resolve_units(first)
+    assert positions(second) == positions(board)
+    assert state.deserialize(data).zobrist_hash() == board.zobrist_hash()
+
+def test_layout_changes_stay_off_the_template(board):
+    data = state.serialize(board)
+    restored = state.deserialize(data)
+    restored[4][4].city = 1
+    restored.cell(4, 5).type = "lake"
+    with pytest.raises(ValueError):
+        restored.cells[0].city = 2
+    assert positions(state.deserialize(data)) == positions(board)
+    assert restored[4][4].city == 1
+    assert restored.cells[0].city is None
+
+def test_rejects_bad_input(board):
+    data = state.serialize(board)
+    with pytest.raises(ValueError):
+        state.deserialize(b"XXXX" + data[4:])
+    with pytest.raises(ValueError):
+        state.deserialize(data[:-1])
+    class Scout(grid.Unit):
+        vision = 2
+    grid.remove_unit(board, grid.get_player_units(board, 2)[0])
+    grid.add_unit(board, Scout(2), board[3][3])
+    with pytest.raises(ValueError):
+        state.serialize(board)